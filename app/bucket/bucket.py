@@ -1,17 +1,54 @@
+from functools import lru_cache
+from threading import Lock
+
 from supabase import create_client, Client
+from storage3._sync.file_api import SyncBucketProxy
 from utils.env import SupabaseEnv
 from utils.constants import ConstTheme
 
 
 class SupabaseBucket:
+	"""
+		Supabase media bucket, the public urls are composed locally and the client is created on first use
+		ATTRIBUTES:
+			public_url: str, base of the public urls of the media bucket
+		METHODS:
+			client: return the supabase client
+			media_bucket: return the media bucket
+			get_image_url: return the public url of a file
+			get_image_urls: return the public urls of many files
+			logo: return the public url of the logo
+	"""
+
+	public_url: str = f'{SupabaseEnv.URL}/storage/v1/object/public/{SupabaseEnv.MEDIA_BUCKET}'
+	__client: Client = None
+	__lock = Lock()
 
-	client: Client = create_client(SupabaseEnv.URL, SupabaseEnv.KEY)
-	media_bucket = client.storage.from_(SupabaseEnv.MEDIA_BUCKET)
+	@classmethod
+	def client(cls) -> Client:
+		with cls.__lock:
+			if cls.__client is None:
+				cls.__client = create_client(SupabaseEnv.URL, SupabaseEnv.KEY)
+			return cls.__client
 
 	@classmethod
+	def media_bucket(cls) -> SyncBucketProxy:
+		return cls.client().storage.from_(SupabaseEnv.MEDIA_BUCKET)
+
+	@classmethod
+	@lru_cache(maxsize=1024)
 	def get_image_url(cls, filename: str) -> str:
-		return cls.media_bucket.get_public_url(filename)
+		"""
+			Return the public url of a file, same as the one built by the storage client
+			:param filename: str
+			:return: str
+		"""
+		return f'{cls.public_url}/{filename}?'
+
+	@classmethod
+	def get_image_urls(cls, filenames: list[str]) -> list[str]:
+		return [cls.get_image_url(filename) for filename in filenames]
 
 	@classmethod
 	def logo(cls, theme=ConstTheme.get_label(ConstTheme.LIGHT)) -> str:
-		return cls.media_bucket.get_public_url(f'Logo/{theme}.png')
+		return cls.get_image_url(f'Logo/{theme}.png')
@@ -2,7 +2,6 @@ from json import loads
 from traceback import format_exc
 
 from app.services.account import AccountService
-from app.services.context import Context
 from app.consumers.consumer import Consumer
 from utils.tools import response
 from utils.messages import Errors
@@ -24,8 +23,6 @@ class AccountConsumer(AccountService, Consumer):
 	"""
 
 	async def disconnect(self, close_code: int = None):
-		if self.identifier in Context:
-			del Context[self.identifier]
 		await self.channel_layer.group_discard('events.account', self.channel_name)
 		await super().disconnect(close_code)
 
@@ -42,7 +39,7 @@ class AccountConsumer(AccountService, Consumer):
 		try:
 			data: dict = loads(text_data)
 			result = await self.fulfill_request(data)
-			if data['actionName'] == 'login' and result['status']:
+			if data['actionName'] in ('login', 'guestLogin') and result['status']:
 				self.identifier = result['content']['identifier']
 
 			response_data = self.response(data['actionName'], result)
@@ -1,8 +1,14 @@
+from datetime import date, datetime, time
 from json import loads
 from traceback import format_exc
 
 from app.consumers.consumer import Consumer
+from app.models.booking import BookingModel
+from app.models.user import TempUser
 from app.services.booking import BookingService
+from app.services.calendar import CalendarCache
+from app.services.context import Context
+from utils.constants import ConstBookingGroups, ConstRoles
 from utils.tools import response
 from utils.messages import Errors
 
@@ -14,23 +20,66 @@ class BookingConsumer(BookingService, Consumer):
 			entity: BookingEntity
 			actionName: str
 			actionParams: dict
+			user: UserModel | TempUser, the user of the last identifier received
+			groups: set[str], the booking groups joined
 		METHODS:
 			fulfill_request: fulfill request
 			make_response: make response
 			connect: connect
 			disconnect: disconnect
 			receive: receive
+			subscribe: join the booking groups of a user
 			booking_message: booking message
+			booking_delta: booking delta
 	"""
 
+	user = None
+	groups: set[str] = set()
+
 	async def connect(self):
-		await self.channel_layer.group_add('events.booking', self.channel_name)
+		self.user = TempUser()
+		self.groups = set()
+		await self.channel_layer.group_add(ConstBookingGroups.RELOAD, self.channel_name)
+		await self.join({ConstBookingGroups.PUBLIC})
 		await super().connect()
 
 	async def disconnect(self, close_code: int = None):
-		await self.channel_layer.group_discard('events.booking', self.channel_name)
+		await self.channel_layer.group_discard(ConstBookingGroups.RELOAD, self.channel_name)
+		await self.join(set())
 		await super().disconnect(close_code)
 
+	async def join(self, groups: set[str]):
+		"""
+			Leave the groups not in groups and join the new ones
+			:param groups: set[str]
+		"""
+		for group in self.groups - groups:
+			await self.channel_layer.group_discard(group, self.channel_name)
+		for group in groups - self.groups:
+			await self.channel_layer.group_add(group, self.channel_name)
+		self.groups = groups
+
+	async def subscribe(self, identifier: str):
+		"""
+			Join the booking groups of the user of identifier, an unknown or expired identifier
+			falls back to the public group
+			:param identifier: str
+		"""
+		if not identifier:
+			return
+		user = await Context.get_async(identifier)
+		if not user:
+			self.user = TempUser()
+			await self.join({ConstBookingGroups.PUBLIC})
+			return
+		self.user = user
+		if user.role == ConstRoles.ADMIN:
+			await self.join({ConstBookingGroups.ADMIN})
+		elif user.role == ConstRoles.GUEST:
+			await self.join({ConstBookingGroups.PUBLIC})
+		else:
+			await self.join({ConstBookingGroups.PUBLIC, ConstBookingGroups.USER.format(id_user=user.id)})
+
 	async def receive(self, text_data: str = None, bytes_data: bytes = None):
 		"""
 			Called when a message is received with either text or bytes
@@ -44,6 +93,7 @@ class BookingConsumer(BookingService, Consumer):
 		try:
 			data: dict = loads(text_data)
 			result = await self.fulfill_request(data)
+			await self.subscribe(self.actionParams.get('identifier'))
 			response_data = self.response(data['actionName'], result)
 
 		except Exception:
@@ -53,6 +103,37 @@ class BookingConsumer(BookingService, Consumer):
 
 	async def booking_message(self, _event):
 		"""
-			Used by group_send to send a message to group
+			Used by group_send to send a message to group, kept for the clients still reloading the calendar
 		"""
 		await self.send(self.make_response(_event['message']))
+
+	async def booking_delta(self, _event):
+		"""
+			Used by group_send to push the changed slots, filtered and overlaid for the user
+		"""
+		now = datetime.now()
+		slots = []
+		for slot in _event['slots']:
+			if slot.get('removed'):
+				slots.append({'id': slot['id'], 'removed': True})
+				continue
+
+			booking = BookingModel(
+				date=date.fromisoformat(slot['date']),
+				start=time.fromisoformat(slot['start']),
+				end=time.fromisoformat(slot['end']),
+				id_user=slot['id_user'],
+				status=slot['status'],
+			)
+			slots.append({
+				'id': slot['id'],
+				'date': booking.date.strftime('%Y%m%d'),
+				'booking': CalendarCache.overlay(booking, slot['booking'], self.user, now),
+			})
+
+		if slots:
+			await self.send(self.make_response(self.response('delta', response(True, '', {
+				'year': _event['year'],
+				'month': _event['month'],
+				'slots': slots,
+			}))))
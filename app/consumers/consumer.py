@@ -1,11 +1,14 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from app.services.context import Context
+from utils.env import ContextEnv
+
 
 class Consumer(AsyncWebsocketConsumer):
 	"""
 		Consumer
 		ATTRIBUTES:
-			identifier: str
+			identifier: str, the Context entry issued on this connection
 		METHODS:
 			connect: connect
 			disconnect: disconnect
@@ -24,6 +27,8 @@ class Consumer(AsyncWebsocketConsumer):
 			Called when the WebSocket closes for any reason.
 			:param close_code: Int
 		"""
+		if ContextEnv.RELEASE_ON_DISCONNECT and self.identifier:
+			await Context.delete_async(self.identifier)
 		for attr in self.__dict__:
 			setattr(self, attr, None)
 
@@ -1,13 +1,39 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_PAUSED, STATE_RUNNING
+from atexit import register
 from importlib import import_module
+from threading import Thread
+from time import sleep
+from traceback import format_exc
 from yaml import safe_load
 
+from app.cronjobs.leader import LocalLeader, RedisLeader, PostgresLeader
 from app.cronjobs.utils import cron_to_dict
-from utils.env import SettingsEnv
+from app.services.error import ErrorService
+from utils.env import SettingsEnv, CronEnv, EventEnv
 
 
 class Cron:
+	"""
+		Scheduler of the cronjobs, with a leader mode other than LOCAL only the process holding the leader lock
+		runs the schedule, the others keep it paused and take over when the lock is released or expires.
+		The jobs swept by the mail events run on their events_schedule while EventEnv.MAIL_EVENTS is on
+		ATTRIBUTES:
+			scheduler: BackgroundScheduler
+			leaders: dict[str, type]
+			leader: LocalLeader | RedisLeader | PostgresLeader, selected by CronEnv.LEADER
+		METHODS:
+			start_process: load the crontab and start the scheduler
+			elect: run the leader election, resume or pause the scheduler accordingly
+	"""
+
 	scheduler = BackgroundScheduler(timezone=SettingsEnv.TIMEZONE)
+	leaders = {
+		'LOCAL': LocalLeader,
+		'REDIS': RedisLeader,
+		'POSTGRES': PostgresLeader,
+	}
+	leader: LocalLeader | RedisLeader | PostgresLeader = None
 
 	@classmethod
 	def start_process(cls):
@@ -15,5 +41,31 @@ class Cron:
 			crontab = safe_load(crontab.read())
 			for cronjob in crontab:
 				program = vars(import_module(cronjob['job']['path'])).get(cronjob['job']['program'])
-				cls.scheduler.add_job(program(), 'cron', id=cronjob['name'], name=cronjob['name'], **cron_to_dict(cronjob['schedule']))
-		cls.scheduler.start()
+				schedule = cronjob.get('events_schedule', cronjob['schedule']) if EventEnv.MAIL_EVENTS else cronjob['schedule']
+				cls.scheduler.add_job(program(), 'cron', id=cronjob['name'], name=cronjob['name'], **cron_to_dict(schedule))
+
+		cls.leader = cls.leaders[CronEnv.LEADER]()
+		if isinstance(cls.leader, LocalLeader):
+			cls.scheduler.start()
+			return
+
+		cls.scheduler.start(paused=True)
+		register(cls.leader.release)
+		Thread(target=cls.elect, name='cron-leader', daemon=True).start()
+
+	@classmethod
+	def elect(cls):
+		while True:
+			# noinspection PyBroadException
+			try:
+				leader = cls.leader.acquire()
+			except Exception:
+				ErrorService.save_error(format_exc())
+				leader = False
+
+			if leader and cls.scheduler.state == STATE_PAUSED:
+				cls.scheduler.resume()
+			elif not leader and cls.scheduler.state == STATE_RUNNING:
+				cls.scheduler.pause()
+
+			sleep(CronEnv.LEADER_INTERVAL)
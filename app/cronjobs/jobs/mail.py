@@ -18,13 +18,8 @@ class MailJob(Job):
 			# noinspection PyBroadException
 			try:
 				with SendEmail() as email_sender:
-					for _mail in res['content']:
-						# noinspection PyBroadException
-						try:
-							email_sender.send_mail(_mail)
-						except:
-							print_error(format_exc())
-							_mail.set_error()
+					completed, errors = email_sender.send_mails(res['content'])
+				MailService.set_mails_results(completed, errors)
 			except:
 				print_error(format_exc())
 				ErrorService.save_error()
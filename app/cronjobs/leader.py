@@ -0,0 +1,106 @@
+from uuid import uuid4
+
+from redis import Redis
+from sqlalchemy import text, Connection
+
+from app.models.base import SessionModel
+from utils.env import CronEnv, RedisEnv
+
+
+class LocalLeader:
+	"""
+		Every process runs the schedule
+	"""
+
+	def acquire(self) -> bool:
+		return True
+
+	def release(self):
+		pass
+
+
+class RedisLeader:
+	"""
+		Leader lock on a Redis key holding the token of the leader, renewed at every election
+		and expiring after CronEnv.LEADER_TTL seconds if the leader stops renewing it
+		ATTRIBUTES:
+			key: str
+			client: Redis
+			token: str
+			leader: bool
+	"""
+
+	key = 'cron:leader'
+	renew_script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+	release_script = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+	def __init__(self):
+		self.client = Redis(host=RedisEnv.HOST, port=int(RedisEnv.PORT))
+		self.token = str(uuid4())
+		self.leader = False
+
+	def acquire(self) -> bool:
+		"""
+			Renew the lock if held, else try to take it
+			:return: bool, True if this process is the leader
+		"""
+		ttl = int(CronEnv.LEADER_TTL * 1000)
+		try:
+			if self.leader:
+				self.leader = bool(self.client.eval(self.renew_script, 1, self.key, self.token, ttl))
+			else:
+				self.leader = bool(self.client.set(self.key, self.token, px=ttl, nx=True))
+		except Exception:
+			self.leader = False
+			raise
+		return self.leader
+
+	def release(self):
+		if self.leader:
+			self.leader = False
+			self.client.eval(self.release_script, 1, self.key, self.token)
+
+
+class PostgresLeader:
+	"""
+		Leader lock on a session level advisory lock, held by a dedicated connection.
+		The lock is released by the database as soon as the connection of the leader is lost
+		ATTRIBUTES:
+			connection: Connection, open while this process is the leader
+	"""
+
+	def __init__(self):
+		self.connection: Connection = None
+
+	def acquire(self) -> bool:
+		"""
+			Check the connection holding the lock, else try to take it
+			:return: bool, True if this process is the leader
+		"""
+		if self.connection is not None:
+			try:
+				self.connection.execute(text('SELECT 1'))
+				return True
+			except Exception:
+				self.connection.invalidate()
+				self.connection = None
+				raise
+
+		connection = SessionModel.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+		try:
+			if connection.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': CronEnv.LEADER_LOCK_ID}).scalar():
+				self.connection = connection
+				return True
+		except Exception:
+			connection.close()
+			raise
+		connection.close()
+		return False
+
+	def release(self):
+		if self.connection is not None:
+			connection, self.connection = self.connection, None
+			try:
+				connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': CronEnv.LEADER_LOCK_ID})
+			finally:
+				connection.close()
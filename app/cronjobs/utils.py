@@ -1,44 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from json import loads
+from functools import lru_cache
+from json import dumps, loads
+from queue import LifoQueue, Empty
 from smtplib import SMTP_SSL, SMTPResponseException, SMTPRecipientsRefused, SMTPException
-from string import Template
+from threading import BoundedSemaphore
+from time import monotonic
 from typing import Union
 
 from app.bucket.bucket import SupabaseBucket
 from app.services.error import ErrorService
-from mail.mail import mails
+from mail.mail import templates
 from utils.exceptions import exception
-from utils.env import EmailEnv, SettingsEnv, InfoEnv, IconEnv
+from utils.env import EmailEnv, SettingsEnv, InfoEnv, IconEnv, SupabaseEnv
 from utils.constants import Time, EnumMailTypes, EnumBookingStates, ConstConfirmCodes, EnumMailComponents, ConstActionCodes
 from utils.messages import Messages
 
 
+class SMTPPool:
+	"""
+		Pool of authenticated SMTP connections, kept open between the runs of the mail jobs
+		ATTRIBUTES:
+			idle: LifoQueue[tuple[float, SMTP_SSL]], the free connections with their last use
+			slots: BoundedSemaphore, bounds the connections in use to EmailEnv.POOL_SIZE
+		METHODS:
+			connect: open an authenticated connection
+			checkout: return an idle connection still alive, or a new one
+			connection: check out a connection, to be used with with
+			close: close a connection
+	"""
+
+	idle: LifoQueue = LifoQueue()
+	slots: BoundedSemaphore = BoundedSemaphore(EmailEnv.POOL_SIZE)
+
+	@staticmethod
+	def connect() -> SMTP_SSL:
+		server = SMTP_SSL(EmailEnv.HOST, EmailEnv.PORT)
+		server.login(EmailEnv.INFO.EMAIL, EmailEnv.INFO.TOKEN)
+		return server
+
+	@staticmethod
+	def close(server: SMTP_SSL):
+		try:
+			server.quit()
+		except (SMTPException, OSError):
+			server.close()
+
+	@classmethod
+	def checkout(cls) -> SMTP_SSL:
+		"""
+			Return an idle connection still alive, or a new one
+			:return: SMTP_SSL
+		"""
+		while True:
+			try:
+				last_use, server = cls.idle.get_nowait()
+			except Empty:
+				return cls.connect()
+			if monotonic() - last_use < EmailEnv.POOL_IDLE:
+				try:
+					if server.noop()[0] == 250:
+						return server
+				except (SMTPException, OSError):
+					pass
+			cls.close(server)
+
+	@classmethod
+	@contextmanager
+	def connection(cls) -> SMTP_SSL:
+		"""
+			Check out a connection, given back to the pool on success and on the refusals of the server,
+			which leave the session usable. On any other error it is closed
+			:return: SMTP_SSL
+		"""
+		with cls.slots:
+			server = cls.checkout()
+			reusable = False
+			try:
+				yield server
+				reusable = True
+			except (SMTPResponseException, SMTPRecipientsRefused):
+				reusable = True
+				raise
+			finally:
+				if reusable:
+					cls.idle.put((monotonic(), server))
+				else:
+					cls.close(server)
+
+
 class SendEmail:
 	"""
 		Send Email class
 	"""
 
-	__server = None
-	__host = ''
-	__port = 0
 	__sender = ''
-	__password = ''
 
 	def __init__(self):
-		self.__port, self.__host, self.__sender, self.__password = EmailEnv.PORT, EmailEnv.HOST, EmailEnv.INFO.EMAIL, EmailEnv.INFO.TOKEN
+		self.__sender = EmailEnv.INFO.EMAIL
 
 	def __enter__(self):
-		self.__server = SMTP_SSL(self.__host, self.__port)
-		self.__server.login(self.__sender, self.__password)
 		return self
 
 	def __exit__(self, exc_type, exc_val, exc_tb):
-		if self.__server:
-			try:
-				self.__server.quit()
-			except SMTPResponseException:
-				pass
+		pass
 
 	@exception(False)
 	def __send_mail(self, receiver: str, subject: str, message: str, _type: str = 'html') -> bool:
@@ -56,7 +123,8 @@ class SendEmail:
 		mail['Subject'] = subject
 		mail.attach(MIMEText(message, _type))
 		try:
-			self.__server.sendmail(self.__sender, mail['To'], mail.as_string())
+			with SMTPPool.connection() as server:
+				server.sendmail(self.__sender, mail['To'], mail.as_string())
 			return True
 		except (SMTPResponseException, SMTPRecipientsRefused) as e:
 			ErrorService.save_error(e.smtp_error)
@@ -68,27 +136,83 @@ class SendEmail:
 			ErrorService.save_error(e)
 			return False
 
-	def send_mail(self, mail):
+	@exception(False)
+	def send_mail(self, mail) -> bool:
 		"""
 			Send a mail
 			:param mail: Mail
+			:return: bool
 		"""
 		message = self.fill_template(loads(mail.params), mail.type)
-		res = self.__send_mail(mail.receiver, mail.subject, message)
-		if res:
-			mail.set_completed(mail.id)
-		else:
-			mail.set_error()
+		return self.__send_mail(mail.receiver, mail.subject, message)
+
+	def send_mails(self, _mails: list) -> tuple[list[int], list[int]]:
+		"""
+			Send the mails concurrently, at most EmailEnv.CONCURRENCY at a time
+			:param _mails: list[Mail]
+			:return: tuple[list[int], list[int]], ids of the mails sent and of the mails in error
+		"""
+		with ThreadPoolExecutor(max_workers=EmailEnv.CONCURRENCY, thread_name_prefix='mail') as pool:
+			results = list(pool.map(self.send_mail, _mails))
+		completed = [mail.id for mail, sent in zip(_mails, results) if sent]
+		errors = [mail.id for mail, sent in zip(_mails, results) if not sent]
+		return completed, errors
+
+	@classmethod
+	def chrome(cls) -> tuple[str, str]:
+		"""
+			Return the template around the body with footer, icons and logo filled, split at the body.
+			It is rendered once per process and again only when the configured urls change
+			:return: tuple[str, str]
+		"""
+		return cls.__chrome(SettingsEnv.URL, SupabaseEnv.URL, SupabaseEnv.MEDIA_BUCKET)
 
 	@staticmethod
-	def fill_template(params: dict, _type: str) -> str:
+	@lru_cache(maxsize=1)
+	def __chrome(link: str, *_) -> tuple[str, str]:
+		icons = {}
+		urls = SupabaseBucket.get_image_urls(['/'.join([IconEnv.SOCIAL, value['icon']]) for value in IconEnv.ICONS.values()])
+
+		for (key, value), url in zip(IconEnv.ICONS.items(), urls):
+			icons.update({
+				key + '_icon': url,
+				key + '_link': value['url']
+			})
+
+		footer = templates[EnumMailComponents.FOOTER].safe_substitute({
+			'link': link,
+			**icons
+		})
+		marker = '\x00body\x00'
+		head, tail = templates[EnumMailComponents.TEMPLATE].safe_substitute({
+			'body': marker,
+			'footer': footer,
+			'link': link,
+			'logo': SupabaseBucket.logo(),
+		}).split(marker, 1)
+		return head, tail
+
+	@classmethod
+	def fill_template(cls, params: dict, _type: str) -> str:
 		"""
-			Fill a template with the given params
+			Fill a template with the given params, the bodies are memoized per type and params
 			:param params: dict
 			:param _type: str
 			:return: str
 		"""
-		template: str = mails['TEMPLATE']
+		head, tail = cls.chrome()
+		return head + cls.render_body(_type, dumps(params, sort_keys=True, default=str)) + tail
+
+	@staticmethod
+	@lru_cache(maxsize=EmailEnv.RENDER_CACHE_SIZE)
+	def render_body(_type: str, params: str) -> str:
+		"""
+			Render the body of a mail
+			:param _type: str
+			:param params: str, params as json
+			:return: str
+		"""
+		params: dict = loads(params)
 
 		def update_html(param: Union[list, str]) -> str:
 			if param:
@@ -122,19 +246,6 @@ class SendEmail:
 		for key in params.keys():
 			params[key] = params[key] or ''
 
-		icons = {}
-
-		for key, value in IconEnv.ICONS.items():
-			icons.update({
-				key + '_icon': SupabaseBucket.get_image_url('/'.join([IconEnv.SOCIAL, value['icon']])),
-				key + '_link': value['url']
-			})
-
-		footer = Template(mails[EnumMailComponents.FOOTER]).safe_substitute({
-			'link': SettingsEnv.URL,
-			**icons
-		})
-
 		match _type:
 			case EnumMailTypes.CANCEL | EnumMailTypes.UPDATE | EnumMailTypes.BOOK_BOOKING:
 				status = [EnumBookingStates.get_label(state) for state in params['status']] if isinstance(params['status'], list) else EnumBookingStates.get_label(params['status'])
@@ -145,11 +256,10 @@ class SendEmail:
 					'end': update_html(params['end']),
 					'note': update_html(params['note'])
 				})
-				booking_details = mails[EnumMailComponents.BOOKING_DETAILS]
 
 				all_params = {
 					**params,
-					EnumMailComponents.BOOKING_DETAILS.lower(): Template(booking_details).safe_substitute(params)
+					EnumMailComponents.BOOKING_DETAILS.lower(): templates[EnumMailComponents.BOOKING_DETAILS].safe_substitute(params)
 				}
 			case EnumMailTypes.CONFIRM_BOOKING:
 				params.update({
@@ -159,13 +269,11 @@ class SendEmail:
 					'address': InfoEnv.ADDRESS,
 					'phone': InfoEnv.PHONE_NUMBER,
 				})
-				booking_details = mails[EnumMailComponents.BOOKING_DETAILS]
-				button = mails[EnumMailComponents.BUTTON]
 
 				all_params = {
 					**params,
-					EnumMailComponents.BOOKING_DETAILS.lower(): Template(booking_details).safe_substitute(params),
-					EnumMailComponents.BUTTON.lower(): Template(button).safe_substitute(params),
+					EnumMailComponents.BOOKING_DETAILS.lower(): templates[EnumMailComponents.BOOKING_DETAILS].safe_substitute(params),
+					EnumMailComponents.BUTTON.lower(): templates[EnumMailComponents.BUTTON].safe_substitute(params),
 				}
 			case EnumMailTypes.REQUEST_BOOKING:
 				params.update({
@@ -180,15 +288,11 @@ class SendEmail:
 					'birthday': params['client']['birthday'],
 				})
 
-				user_details = mails[EnumMailComponents.USER_DETAILS]
-				booking_details = mails[EnumMailComponents.BOOKING_DETAILS]
-				button = mails[EnumMailComponents.BUTTON]
-
 				all_params = {
 					**params,
-					EnumMailComponents.BOOKING_DETAILS.lower(): Template(booking_details).safe_substitute(params),
-					EnumMailComponents.USER_DETAILS.lower(): Template(user_details).safe_substitute(params),
-					EnumMailComponents.BUTTON.lower(): Template(button).safe_substitute(params)
+					EnumMailComponents.BOOKING_DETAILS.lower(): templates[EnumMailComponents.BOOKING_DETAILS].safe_substitute(params),
+					EnumMailComponents.USER_DETAILS.lower(): templates[EnumMailComponents.USER_DETAILS].safe_substitute(params),
+					EnumMailComponents.BUTTON.lower(): templates[EnumMailComponents.BUTTON].safe_substitute(params)
 				}
 			case EnumMailTypes.RULES:
 				params.update({
@@ -199,24 +303,20 @@ class SendEmail:
 					'bus': InfoEnv.BUS,
 					'link': SettingsEnv.URL,
 				})
-				information_details = mails[EnumMailComponents.INFORMATION_DETAILS]
-				regulation_details = mails[EnumMailComponents.REGULATION_DETAILS]
 				all_params = {
 					**params,
-					EnumMailComponents.INFORMATION_DETAILS.lower(): Template(information_details).safe_substitute(params),
-					EnumMailComponents.REGULATION_DETAILS.lower(): Template(regulation_details).safe_substitute(params),
+					EnumMailComponents.INFORMATION_DETAILS.lower(): templates[EnumMailComponents.INFORMATION_DETAILS].safe_substitute(params),
+					EnumMailComponents.REGULATION_DETAILS.lower(): templates[EnumMailComponents.REGULATION_DETAILS].safe_substitute(params),
 				}
 			case EnumMailTypes.GENERATE_NEW_BOOKING:
 				params.update({
 					'buttonLink': SettingsEnv.URL + ConstActionCodes.NEW_BOOKING.format(code=params['code']),
 					'buttonText': Messages.ADD_BOOKING,
 				})
-				new_booking_details = mails[EnumMailComponents.NEW_BOOKING_DETAILS]
-				button = mails[EnumMailComponents.BUTTON]
 				all_params = {
 					**params,
-					EnumMailComponents.NEW_BOOKING_DETAILS.lower(): Template(new_booking_details).safe_substitute(params),
-					EnumMailComponents.BUTTON.lower(): Template(button).safe_substitute(params),
+					EnumMailComponents.NEW_BOOKING_DETAILS.lower(): templates[EnumMailComponents.NEW_BOOKING_DETAILS].safe_substitute(params),
+					EnumMailComponents.BUTTON.lower(): templates[EnumMailComponents.BUTTON].safe_substitute(params),
 				}
 			case EnumMailTypes.CONFIRM_EMAIL | EnumMailTypes.JOIN_ACCOUNT:
 				if _type == EnumMailTypes.CONFIRM_EMAIL:
@@ -228,12 +328,10 @@ class SendEmail:
 					'buttonLink': SettingsEnv.URL + action.format(code=params['code']),
 					'buttonText': Messages.CONFIRM,
 				})
-				user_details = mails[EnumMailComponents.USER_DETAILS]
-				button = mails[EnumMailComponents.BUTTON]
 				all_params = {
 					**params,
-					EnumMailComponents.USER_DETAILS.lower(): Template(user_details).safe_substitute(params),
-					EnumMailComponents.BUTTON.lower(): Template(button).safe_substitute(params),
+					EnumMailComponents.USER_DETAILS.lower(): templates[EnumMailComponents.USER_DETAILS].safe_substitute(params),
+					EnumMailComponents.BUTTON.lower(): templates[EnumMailComponents.BUTTON].safe_substitute(params),
 				}
 			case EnumMailTypes.REQUEST_NEW_BOOKING:
 				client = params['client']
@@ -249,14 +347,11 @@ class SendEmail:
 					'birthday': client.get('birthday', ''),
 					'status': EnumBookingStates.get_label(params['status']),
 				})
-				user_details = mails[EnumMailComponents.USER_DETAILS]
-				button = mails[EnumMailComponents.BUTTON]
-				booking_details = mails[EnumMailComponents.BOOKING_DETAILS]
 				all_params = {
 					**params,
-					EnumMailComponents.USER_DETAILS.lower(): Template(user_details).safe_substitute(params),
-					EnumMailComponents.BUTTON.lower(): Template(button).safe_substitute(params),
-					EnumMailComponents.BOOKING_DETAILS.lower(): Template(booking_details).safe_substitute(params)
+					EnumMailComponents.USER_DETAILS.lower(): templates[EnumMailComponents.USER_DETAILS].safe_substitute(params),
+					EnumMailComponents.BUTTON.lower(): templates[EnumMailComponents.BUTTON].safe_substitute(params),
+					EnumMailComponents.BOOKING_DETAILS.lower(): templates[EnumMailComponents.BOOKING_DETAILS].safe_substitute(params)
 				}
 			case EnumMailTypes.FORGOT_PASSWORD:
 				client = params['client']
@@ -265,10 +360,9 @@ class SendEmail:
 					'buttonText': Messages.RESTORE_PASSWORD_BUTTON,
 					'name': client.get('name', ''),
 				})
-				button = mails[EnumMailComponents.BUTTON]
 				all_params = {
 					**params,
-					EnumMailComponents.BUTTON.lower(): Template(button).safe_substitute(params),
+					EnumMailComponents.BUTTON.lower(): templates[EnumMailComponents.BUTTON].safe_substitute(params),
 				}
 			case _:
 				if 'status' in params:
@@ -278,16 +372,7 @@ class SendEmail:
 					**params,
 				}
 
-		body = Template(mails[_type]).safe_substitute(all_params)
-
-		template_params = {
-			'body': body,
-			'footer': footer,
-			'link': SettingsEnv.URL,
-			'logo': SupabaseBucket.logo(),
-		}
-
-		return Template(template).safe_substitute(template_params)
+		return templates[_type].safe_substitute(all_params)
 
 
 def cron_to_dict(cron: str) -> dict[str, str]:
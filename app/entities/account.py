@@ -1,7 +1,7 @@
 from datetime import date
 from hashlib import sha256
 from json import dumps, loads
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select
 from typing import Union
 from uuid import uuid4
 
@@ -11,6 +11,7 @@ from utils.constants import EnumActionType
 from utils.tools import response, Parameter
 from utils.messages import Errors, Messages
 from utils.exceptions import exception
+from utils.executor import blocking
 
 
 class AccountEntity(Entity):
@@ -30,8 +31,9 @@ class AccountEntity(Entity):
 		super().__init__(**kwargs)
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.LOGIN))
-	async def login(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def login(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Login user
 			:param kwargs: {email: str, password: str, uuid: str}
@@ -99,31 +101,29 @@ class AccountEntity(Entity):
 				'uuid': session_user.uuid if session_user else '',
 			})
 		else:
-			return await cls.guest_login()
+			return cls.guest_login()
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.LOGIN))
-	async def guest_login(cls, **_) -> dict[str, Union[bool, str, dict]]:
+	def guest_login(cls, **_) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Login user as guest
 		"""
 		del _
 		user: cls.TempUser = cls.TempUser()
-		identifier = str(uuid4())
-		while identifier in Context:
-			identifier = str(uuid4())
-		Context[identifier] = user
 
 		return response(True, '', {
 			**user.to_dict(),
-			'identifier': identifier,
+			'identifier': Context.add_user(user),
 			'uuid': '',
 		})
 
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.LOGOUT))
-	async def logout(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def logout(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Logout user
 			:param kwargs: {identifier: str, uuid: str}
@@ -156,8 +156,9 @@ class AccountEntity(Entity):
 		return response(True, Messages.LOGOUT)
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.REGISTER))
-	async def register(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def register(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Register user
 			:param kwargs: dict
@@ -285,8 +286,9 @@ class AccountEntity(Entity):
 		})
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.DELETE))
-	async def delete(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def delete(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Delete user
 			:param kwargs: {identifier: str, uuid: str}
@@ -338,18 +340,18 @@ class AccountEntity(Entity):
 			return response(False, f'{Errors.USER_DATA}. {str(e)}')
 		del kwargs
 
-		if not _identifier in Context:
+		user: cls.User = await Context.get_async(_identifier)
+		if not user:
 			return response(False, Errors.USER_DATA,)
-		user: cls.User = Context[_identifier]
-		with cls.get_session(commit=False) as session:
-			session_user: cls.SessionUser = session.query(cls.SessionUser).filter(
+		async with cls.get_async_session(commit=False) as session:
+			session_user: cls.SessionUser = await session.scalar(select(cls.SessionUser).where(
 				and_(
 					cls.SessionUser.id_user == user.id,
 					cls.SessionUser.valid == True,
-				)).order_by(cls.SessionUser.id.desc()).first()
+				)).order_by(cls.SessionUser.id.desc()).limit(1))
 
 			if not session_user:
-				session.rollback()
+				await session.rollback()
 				return response(False, Errors.SESSION)
 
 		return response(True, '', {
@@ -359,8 +361,9 @@ class AccountEntity(Entity):
 		})
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.UPDATE))
-	async def update(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def update(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Update user data
 			:param kwargs: {name: str, surname: str, email: str, phone: str, birthday: str, instagram: str, identifier: str, password: str, confirmPassword: str}
@@ -425,7 +428,7 @@ class AccountEntity(Entity):
 						cls.SessionUser.valid == True,
 					)).order_by(cls.SessionUser.id.desc()).first()
 				if not session_user:
-					session.rollback()
+					cls.rollback(session)
 					return response(False, Errors.SESSION)
 
 		Context[_identifier] = user
@@ -447,8 +450,9 @@ class AccountEntity(Entity):
 		return cls.User.get(cls.User.id == id_user)
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.FORGOT_PASSWORD))
-	async def forgot_password(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def forgot_password(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Forgot password
 			:param kwargs: {email: str}
@@ -475,8 +479,9 @@ class AccountEntity(Entity):
 		return response(True, Messages.FORGOT_PASSWORD)
 
 	@classmethod
+	@blocking
 	@exception(response(False, Errors.RESTORE_PASSWORD))
-	async def restore_password(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def restore_password(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Restore password
 			:param kwargs: {code: str, password: str, confirmPassword: str}
@@ -1,15 +1,17 @@
 from datetime import datetime, time, date
 from itertools import groupby
 from json import dumps, loads
-from sqlalchemy import and_, or_, cast, String, case
+from sqlalchemy import and_, or_, case, select, update
 from typing import Union
 
 from app.entities.entity import Entity
 from app.services.account import AccountService
+from app.services.calendar import CalendarCache
 from app.services.context import Context
 from utils.constants import EnumBookingStates, EnumMailTypes, EnumConfirmationType, EnumActionType, EnumMailStates
 from utils.env import EmailEnv
 from utils.exceptions import exception
+from utils.executor import blocking
 from utils.tools import response, Parameter
 from utils.messages import Errors, Messages, generic_error
 
@@ -52,74 +54,57 @@ class BookingEntity(Entity):
 			return response(False, f'{Errors.GET_CALENDAR}. {str(e)}')
 		del kwargs
 
-		if _identifier not in Context:
+		user: cls.User = await Context.get_async(_identifier)
+		if not user:
 			return response(False, Errors.PERMISSION_DENIED)
 
-		if not _month or not _year:
+		if not _year or not 1 <= _month <= 12:
 			return response(False, Errors.GENERIC_ERROR)
 
 		today: date = datetime.today().date()
-		user: cls.User = Context[_identifier]
 
-		expr = [cast(cls.Booking.date, String).like(f"{_year}-{_month:02}-%")]
-		order_by = (
-			cls.Booking.date,
-			case(
-				(cls.Booking.status == str(EnumBookingStates.FREE), 1),
-				(cls.Booking.status == str(EnumBookingStates.PENDING), 2),
-				(cls.Booking.status == str(EnumBookingStates.BOOKED), 3),
-				(cls.Booking.status == str(EnumBookingStates.CONFIRMED), 4),
-				(cls.Booking.status == str(EnumBookingStates.COMPLETED), 5),
-				(cls.Booking.status == str(EnumBookingStates.CANCELLED), 6),
-				(cls.Booking.status == str(EnumBookingStates.PAUSED), 7),
-				else_=8
-			),
-			cls.Booking.start,
-		)
+		rows = CalendarCache.get(_year, _month, user, today)
+		if rows is None:
+			version = CalendarCache.version(_year, _month)
+			expr = [
+				cls.Booking.date >= date(_year, _month, 1),
+				cls.Booking.date < date(_year + _month // 12, _month % 12 + 1, 1),
+			]
+			order_by = (
+				cls.Booking.date,
+				case(
+					(cls.Booking.status == str(EnumBookingStates.FREE), 1),
+					(cls.Booking.status == str(EnumBookingStates.PENDING), 2),
+					(cls.Booking.status == str(EnumBookingStates.BOOKED), 3),
+					(cls.Booking.status == str(EnumBookingStates.CONFIRMED), 4),
+					(cls.Booking.status == str(EnumBookingStates.COMPLETED), 5),
+					(cls.Booking.status == str(EnumBookingStates.CANCELLED), 6),
+					(cls.Booking.status == str(EnumBookingStates.PAUSED), 7),
+					else_=8
+				),
+				cls.Booking.start,
+			)
 
-		match user.role:
-			case cls.Role.ADMIN:
-				pass
-			case cls.Role.GUEST:
-				expr.extend(
-					[
-						cls.Booking.date >= today,
-						cls.Booking.status == EnumBookingStates.FREE,
-						cls.Booking.id_user.is_(None),
-					]
-				)
-			case _:
-				expr.append(
-					or_(
-						and_(
-							cls.Booking.date >= today,
-							cls.Booking.status == EnumBookingStates.FREE,
-							cls.Booking.id_user.is_(None),
-						),
-						cls.Booking.id_user == user.id
-					)
-				)
+			async with cls.get_async_session(commit=False) as session:
+				bookings: list[cls.Booking] = (await session.scalars(select(cls.Booking).where(and_(*expr)).order_by(*order_by))).all()
 
-		with cls.get_session(commit=False) as session:
-			bookings: list[cls.Booking] = session.query(cls.Booking).filter(and_(*expr)).order_by(*order_by).all()
+			rows = [(booking, booking.to_dict(CalendarCache.excluded)) for booking in bookings]
+			CalendarCache.set(_year, _month, version, rows)
+			rows = CalendarCache.visible(rows, user, today)
 
-		excluded = ('date', 'id_user', 'note', 'id_request', 'upd_datetime', 'upd_user')
 		_now = datetime.now()
 		content = {
 			_date.strftime('%Y%m%d'): [
-				{
-					**booking.to_dict(excluded),
-					'editable': booking.is_editable(user, _now),
-					'other': booking.is_other(user),
-				} for booking in g_booking
-			] for _date, g_booking in groupby(bookings, key=lambda x: x.date)
+				CalendarCache.overlay(booking, payload, user, _now) for booking, payload in g_rows
+			] for _date, g_rows in groupby(rows, key=lambda x: x[0].date)
 		}
 
 		return response(True, '', content)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def book_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def book_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Set booking
 		"""
@@ -137,7 +122,7 @@ class BookingEntity(Entity):
 		user: cls.User = Context[_identifier]
 
 		if user.role == cls.Role.GUEST:
-			new_anon = await AccountService.register(**kwargs)
+			new_anon = AccountService.entity.register(**kwargs)
 			if not new_anon['status']:
 				return new_anon
 			user: cls.User = Context[_identifier]
@@ -210,12 +195,11 @@ class BookingEntity(Entity):
 			return response(False, f'{Errors.GET_BOOKING}. {str(e)}')
 		del kwargs
 
-		if _identifier not in Context:
+		user: cls.User = await Context.get_async(_identifier)
+		if not user:
 			return response(False, Errors.PERMISSION_DENIED)
 
-		user: cls.User = Context[_identifier]
-
-		with (cls.get_session(commit=False) as session):
+		async with cls.get_async_session(commit=False) as session:
 			expr = (cls.Booking.id == _id,)
 			if user.role != cls.Role.ADMIN:
 				expr += (
@@ -226,11 +210,11 @@ class BookingEntity(Entity):
 					),
 				)
 
-			booking: cls.Booking = session.query(cls.Booking).filter(and_(*expr)).first()
+			booking: cls.Booking = await session.scalar(select(cls.Booking).where(and_(*expr)).limit(1))
 
 			if booking:
 				if booking.id_user:
-					customer: cls.User = session.query(cls.User).filter(cls.User.id == int(booking.id_user)).first()
+					customer: cls.User = await session.scalar(select(cls.User).where(cls.User.id == int(booking.id_user)).limit(1))
 				else:
 					customer = cls.TempUser()
 
@@ -267,10 +251,11 @@ class BookingEntity(Entity):
 			return response(False, f'{Errors.GET_BOOKING_INTERNAL_DATA}. {str(e)}')
 		del kwargs
 
-		if _identifier not in Context or Context[_identifier].role != cls.Role.ADMIN:
+		admin: cls.User = await Context.get_async(_identifier)
+		if not admin or admin.role != cls.Role.ADMIN:
 			return response(False, Errors.PERMISSION_DENIED)
 
-		internal_note: cls.BookingNote = cls.BookingNote.get(cls.BookingNote.id_booking == _id)
+		internal_note: cls.BookingNote = await cls.BookingNote.get_async(cls.BookingNote.id_booking == _id)
 
 		return response(True, '', {'internalNote': internal_note.note if internal_note else ''})
 
@@ -308,26 +293,26 @@ class BookingEntity(Entity):
 			_year: int = Parameter('y', kwargs, int, True).value
 			_month: int = Parameter('m', kwargs, int, True).value
 			_day: int = Parameter('d', kwargs, int, True).value
+			_date: date = date(_year, _month, _day)
 		except ValueError as e:
 			return response(False, f'{Errors.GET_BOOKINGS}. {str(e)}')
 		del kwargs
 
-		if _identifier not in Context or Context[_identifier].role != cls.Role.ADMIN:
+		user: cls.User = await Context.get_async(_identifier)
+		if not user or user.role != cls.Role.ADMIN:
 			return response(False, Errors.PERMISSION_DENIED)
 
-		user: cls.User = Context[_identifier]
-
-		with cls.get_session(commit=False) as session:
-			bookings: list[cls.Booking] = session.query(cls.Booking).filter(
-				and_(cast(cls.Booking.date, String) == f'{_year}-{_month:02}-{_day:02}')
+		async with cls.get_async_session(commit=False) as session:
+			booking_customers: list[tuple[cls.Booking, cls.User]] = (
+				await session.execute(
+					select(cls.Booking, cls.User)
+					.outerjoin(cls.User, cls.Booking.id_user == cls.User.id)
+					.where(cls.Booking.date == _date)
+				)
 			).all()
 
-			if not bookings:
-				return response(True, Errors.NO_BOOKING, {'bookings': []})
-
-			customers: list[cls.User] = session.query(cls.User).filter(cls.User.id.in_(
-				set(res.id_user for res in bookings)
-			)).all()
+		if not booking_customers:
+			return response(True, Errors.NO_BOOKING, {'bookings': []})
 
 		user_exclude = ('id', 'password', 'valid', 'upd_datetime')
 		_now = datetime.now()
@@ -335,21 +320,22 @@ class BookingEntity(Entity):
 		result = tuple(
 			{
 				**booking.to_dict(),
-				**(next((customer.to_dict(user_exclude) for customer in customers if customer.id == booking.id_user), {})),
+				**(customer.to_dict(user_exclude) if customer else {}),
 				'editable': booking.is_editable(user, _now),
 				'other': booking.is_other(user),
 				'acceptable': booking.is_acceptable(user),
 				'confirmable': booking.is_confirmable(user),
 				'disposable': booking.is_disposable(user),
 				'erasable': booking.is_erasable(user),
-			} for booking in bookings
+			} for booking, customer in booking_customers
 		)
 
 		return response(True, '', {'bookings': result})
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def cancel_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def cancel_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Cancel Booking
 			:param kwargs: dict
@@ -419,8 +405,9 @@ class BookingEntity(Entity):
 		return response(True, Messages.CANCEL)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def create_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def create_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Create Booking
 			:param kwargs: dict
@@ -453,8 +440,9 @@ class BookingEntity(Entity):
 		return response(True, Messages.NEW_BOOKING)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def request_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def request_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Request Booking
 			:param kwargs: dict
@@ -494,8 +482,9 @@ class BookingEntity(Entity):
 		return response(True, Messages.SENDED_NEW_REQUEST_BOOKING)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def edit_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def edit_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Edit Booked
 			:param kwargs: dict
@@ -518,7 +507,7 @@ class BookingEntity(Entity):
 			return response(False, Errors.PERMISSION_DENIED)
 
 		if _internal_note:
-			res = await cls.edit_booking_internal_data(identifier=_identifier, id=_id, internalNote=_internal_note)
+			res = cls.edit_booking_internal_data(identifier=_identifier, id=_id, internalNote=_internal_note)
 			if not res['status']:
 				return res
 
@@ -549,10 +538,7 @@ class BookingEntity(Entity):
 				if booking.status == EnumBookingStates.COMPLETED:
 					send_mail = False
 					if booking.id_user:
-						customer: cls.User = session.query(cls.User).filter(cls.User.id == int(booking.id_user)).first()
-						coupon = cls.Coupon.get_by_user(customer)
-						if coupon:
-							coupon.increase()
+						cls.Coupon.increase_many([booking.id_user], session)
 
 			else:
 				if user.id != booking.id_user:
@@ -585,8 +571,9 @@ class BookingEntity(Entity):
 		return response(True, Messages.EDIT_BOOKING)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def edit_booking_internal_data(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def edit_booking_internal_data(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Edit Booking Internal Data
 		"""
@@ -615,8 +602,9 @@ class BookingEntity(Entity):
 		return response(True, Messages.EDIT_BOOKING_INTERNAL_DATA)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def delete_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def delete_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Delete Booking
 		"""
@@ -638,8 +626,9 @@ class BookingEntity(Entity):
 		return response(True, Messages.DELETE)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def accept_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def accept_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Accept Booking
 			:param kwargs: dict
@@ -708,8 +697,9 @@ class BookingEntity(Entity):
 		return response(True, Messages.ACCEPT_BOOKING)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def confirm_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
+	def confirm_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
 		"""
 			Confirm Booking
 			:param kwargs: dict
@@ -904,27 +894,35 @@ class BookingEntity(Entity):
 		"""
 		with cls.get_session() as session:
 			now = datetime.now()
-			bookings: list[cls.Booking] = session.query(cls.Booking).filter(
-				and_(
-					cls.Booking.status == EnumBookingStates.CONFIRMED,
-					or_(
-						cls.Booking.date < now.date(),
-						and_(
-							cls.Booking.date == now.date(),
-							cls.Booking.end <= now.time()
+			completed: list[tuple[int, int, date]] = session.execute(
+				update(cls.Booking).where(
+					and_(
+						cls.Booking.status == EnumBookingStates.CONFIRMED,
+						or_(
+							cls.Booking.date < now.date(),
+							and_(
+								cls.Booking.date == now.date(),
+								cls.Booking.end <= now.time()
+							)
 						)
 					)
-				)
+				).values(
+					status=EnumBookingStates.COMPLETED
+				).returning(
+					cls.Booking.id, cls.Booking.id_user, cls.Booking.date
+				).execution_options(synchronize_session=False)
 			).all()
 
-			for booking in bookings:
-				booking.status = EnumBookingStates.COMPLETED
+			if not completed:
+				return response(True, Messages.COMPLETE_BOOKINGS)
 
-				if booking.id_user:
-					customer: cls.User = session.query(cls.User).filter(cls.User.id == int(booking.id_user)).first()
-					coupon = cls.Coupon.get_by_user(customer)
-					if coupon:
-						coupon.increase()
+			cls.Coupon.increase_many([id_user for _, id_user, _ in completed if id_user], session)
+
+			# the bulk update does not fire the mapper events, the months are collected for BookingEvent here
+			changes: dict = session.info.setdefault('booking', {})
+			for _id, _, _date in completed:
+				CalendarCache.invalidate(_date.year, _date.month)
+				changes.setdefault((_date.year, _date.month), set()).add(_id)
 
 		return response(True, Messages.COMPLETE_BOOKINGS)
 
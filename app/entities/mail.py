@@ -1,10 +1,10 @@
-from sqlalchemy import and_, cast
+from sqlalchemy import and_, or_, cast, func
 from sqlalchemy.dialects.postgresql import TIMESTAMP, INTERVAL
 from datetime import datetime
 from json import dumps, loads
 
 from app.entities.entity import Entity
-from utils.constants import EnumMailTypes, EnumBookingStates, EnumConfirmationType, EnumActionType
+from utils.constants import EnumMailTypes, EnumBookingStates, EnumConfirmationType, EnumActionType, EnumMailStates
 from utils.exceptions import exception
 from utils.env import EmailEnv
 from utils.tools import response
@@ -20,19 +20,61 @@ class MailEntity(Entity):
 	@exception(generic_error)
 	def get_mails_to_send(cls) -> dict:
 		"""
-			Get all mails to send
+			Claim a batch of mails to send, the rows locked by another worker are skipped and the claimed ones
+			are leased in SENDING for EmailEnv.LEASE seconds. The mails in error wait EmailEnv.BACKOFF seconds
+			doubled at every attempt
 			:return: dict
 		"""
-		mails: cls.Mail = cls.Mail.get_many(and_(
-			cls.Mail.status.in_(['TO_SEND', 'ERROR']),
-			cls.Mail.attempts <= EmailEnv.ATTEMPTS,
-		))
+		now = func.now()
+		with cls.get_session() as session:
+			mails: list[cls.Mail] = session.query(cls.Mail).filter(or_(
+				and_(
+					cls.Mail.status == EnumMailStates.TO_SEND,
+					or_(cls.Mail.sending_datetime.is_(None), cls.Mail.sending_datetime <= now),
+				),
+				and_(
+					cls.Mail.status == EnumMailStates.ERROR,
+					cls.Mail.attempts <= EmailEnv.ATTEMPTS,
+					cls.Mail.upd_datetime + cast(f'{EmailEnv.BACKOFF} SECONDS', INTERVAL) * func.power(2, cls.Mail.attempts - 1) <= now,
+				),
+				and_(
+					cls.Mail.status == EnumMailStates.SENDING,
+					cls.Mail.upd_datetime + cast(f'{EmailEnv.LEASE} SECONDS', INTERVAL) <= now,
+				),
+			)).order_by(cls.Mail.id).limit(EmailEnv.BATCH_SIZE).with_for_update(skip_locked=True).all()
+
+			for mail in mails:
+				mail.status = EnumMailStates.SENDING
+				mail.upd_datetime = now
 
 		if not mails:
 			return response(False, Errors.NO_MAIL, [])
 		else:
 			return response(True, '', mails)
 
+	@classmethod
+	@exception(generic_error)
+	def set_mails_results(cls, completed: list[int], errors: list[int]) -> dict:
+		"""
+			Set the status of the mails sent and of the mails in error in one transaction
+			:param completed: list[int]
+			:param errors: list[int]
+			:return: dict
+		"""
+		with cls.get_session() as session:
+			if completed:
+				session.query(cls.Mail).filter(cls.Mail.id.in_(completed)).update(
+					{cls.Mail.status: EnumMailStates.COMPLETE},
+					synchronize_session=False
+				)
+			if errors:
+				session.query(cls.Mail).filter(cls.Mail.id.in_(errors)).update(
+					{cls.Mail.status: EnumMailStates.ERROR, cls.Mail.attempts: cls.Mail.attempts + 1},
+					synchronize_session=False
+				)
+
+		return response(True)
+
 	@classmethod
 	@exception(generic_error)
 	def get_mail_entity(cls, id_mail: int) -> Entity.Mail:
@@ -51,8 +93,8 @@ class MailEntity(Entity):
 			:return: dict
 		"""
 		with cls.get_session() as session:
-			confirm_ids: list[cls.Confirmation.id] = session.query(
-				cls.Confirmation.id
+			confirm_bookings: list[tuple[cls.Confirmation, cls.Booking, cls.User]] = session.query(
+				cls.Confirmation, cls.Booking, cls.User
 			).join(
 				cls.Booking, and_(
 					cls.Booking.id == cls.Confirmation.id_booking,
@@ -60,55 +102,37 @@ class MailEntity(Entity):
 					cast(cls.Booking.date, TIMESTAMP) + cls.Booking.start - cast(f'{1} DAY', INTERVAL)
 					<= datetime.now(),
 				)
+			).join(
+				cls.User, cls.User.id == cls.Booking.id_user
 			).filter(
 				and_(
 					cls.Confirmation.type == EnumConfirmationType.CONFIRM_BOOKING,
 					cls.Confirmation.id_mail.is_(None),
 				)
-			).all()
+			).with_for_update(of=cls.Confirmation, skip_locked=True).all()
 
-			if not confirm_ids:
+			if not confirm_bookings:
 				return response(True)
 
-			confirm_bookings: list[cls.Confirmation] = session.query(cls.Confirmation).filter(
-				cls.Confirmation.id.in_([c.id for c in confirm_ids])
-			).all()
-
-			bookings: list[cls.Booking] = session.query(cls.Booking).filter(
-				cls.Booking.id.in_([r.id_booking for r in confirm_bookings])
-			).all()
-
-			users: list[cls.User] = session.query(cls.User).filter(
-				cls.User.id.in_(set([r.id_user for r in bookings]))
-			).all()
-
-			params = {}
-
-			for booking in bookings:
-				_user = next((u for u in users if u.id == booking.id_user), None)
-				if not _user:
-					continue
-
-				params.update(
-					{
-						'code': str(next((c.code for c in confirm_bookings if c.id_booking == booking.id), None)),
-						**booking.to_dict(),
-						**_user.to_dict()
-					}
-				)
+			mails: list[tuple[cls.Confirmation, cls.Mail]] = []
+			for confirmation, booking, _user in confirm_bookings:
+				params = {
+					'code': str(confirmation.code),
+					**booking.to_dict(),
+					**_user.to_dict()
+				}
 
-				mail = cls.Mail(
+				mails.append((confirmation, cls.Mail(
 					receiver=_user.email,
 					subject=Messages.MAIL_CONFIRM + Messages.MAIL_TIME.format(date=booking.date.strftime('%d-%m-%Y'), start=f'{booking.start.hour:02}:{booking.start.minute:02}'),
 					params=dumps(params, default=str),
 					_type=EnumMailTypes.CONFIRM_BOOKING,
-				)
-				session.add(mail)
-				session.flush()
-				session.refresh(mail)
+				)))
 
-				_confirm_booking = next((c for c in confirm_bookings if c.id_booking == booking.id), None)
-				_confirm_booking.id_mail = mail.id
+			session.add_all([mail for _, mail in mails])
+			session.flush()
+			for confirmation, mail in mails:
+				confirmation.id_mail = mail.id
 
 		return response(True)
 
@@ -120,33 +144,31 @@ class MailEntity(Entity):
 			:return: dict
 		"""
 		with cls.get_session() as session:
-			booked_bookings: list[cls.Confirmation] = session.query(cls.Confirmation).filter(
+			booked_bookings: list[tuple[cls.Confirmation, cls.Booking, cls.User]] = session.query(
+				cls.Confirmation, cls.Booking, cls.User
+			).join(
+				cls.Booking, cls.Booking.id == cls.Confirmation.id_booking
+			).join(
+				cls.User, cls.User.id == cls.Booking.id_user
+			).filter(
 				and_(
 					cls.Confirmation.type == EnumConfirmationType.ACCEPT_BOOKING,
 					cls.Confirmation.id_mail.is_(None),
 				)
-			).all()
+			).with_for_update(of=cls.Confirmation, skip_locked=True).all()
 
 			if not booked_bookings:
 				return response(True)
 
-			bookings: list[cls.Booking] = session.query(cls.Booking).filter(
-				cls.Booking.id.in_([b.id_booking for b in booked_bookings])
-			).all()
-
-			users: list[cls.User] = session.query(cls.User).filter(
-				cls.User.id.in_(set([r.id_user for r in bookings]))
-			).all()
-
-			for res in bookings:
-				_user: cls.User = next((u for u in users if u.id == res.id_user), None)
+			mails: list[tuple[cls.Confirmation, cls.Mail]] = []
+			for confirmation, res, _user in booked_bookings:
 				params = {
 						'client': _user.to_dict(),
-						'code': str(next((c.code for c in booked_bookings if c.id_booking == res.id), None)),
+						'code': str(confirmation.code),
 						**cls.result_to_dict(res)
 					}
 
-				mail = cls.Mail(
+				mails.append((confirmation, cls.Mail(
 					receiver=EmailEnv.INFO.EMAIL,
 					subject=Messages.MAIL_BOOKING_REQUEST.format(
 						name=_user.name,
@@ -156,13 +178,12 @@ class MailEntity(Entity):
 					),
 					params=dumps(params, default=str),
 					_type=EnumMailTypes.REQUEST_BOOKING,
-				)
-				session.add(mail)
-				session.flush()
-				session.refresh(mail)
+				)))
 
-				_book_booking = next((c for c in booked_bookings if c.id_booking == res.id), None)
-				_book_booking.id_mail = mail.id
+			session.add_all([mail for _, mail in mails])
+			session.flush()
+			for confirmation, mail in mails:
+				confirmation.id_mail = mail.id
 
 		return response(True)
 
@@ -179,7 +200,7 @@ class MailEntity(Entity):
 					cls.Action.id_mail.is_(None),
 					cls.Action.type == EnumActionType.NEW_BOOKING
 				)
-			).all()
+			).with_for_update(skip_locked=True).all()
 
 			if not actions:
 				return response(True)
@@ -214,7 +235,7 @@ class MailEntity(Entity):
 					cls.Action.type == EnumActionType.CONFIRM_EMAIL,
 					cls.Action.id_mail.is_(None),
 				)
-			).all()
+			).with_for_update(skip_locked=True).all()
 
 			if not actions:
 				return response(True)
@@ -248,7 +269,7 @@ class MailEntity(Entity):
 					cls.Action.type == EnumActionType.JOIN_ACCOUNT,
 					cls.Action.id_mail.is_(None),
 				)
-			).all()
+			).with_for_update(skip_locked=True).all()
 
 			if not actions:
 				return response(True)
@@ -282,7 +303,7 @@ class MailEntity(Entity):
 					cls.Action.type == EnumActionType.REQUEST_NEW_BOOKING,
 					cls.Action.id_mail.is_(None),
 				)
-			).all()
+			).with_for_update(skip_locked=True).all()
 
 			if not actions:
 				return response(True)
@@ -326,7 +347,7 @@ class MailEntity(Entity):
 					cls.Action.type == EnumActionType.FORGOT_PASSWORD,
 					cls.Action.id_mail.is_(None),
 				)
-			).all()
+			).with_for_update(skip_locked=True).all()
 
 			if not actions:
 				return response(True)
@@ -1,12 +1,13 @@
 from datetime import datetime, date
 
-from sqlalchemy import and_, case
+from sqlalchemy import and_, case, select
 
 from app.services.booking import BookingService
 from app.entities.entity import Entity
 from app.services.context import Context
 from utils.messages import Errors, generic_error, Messages
 from utils.exceptions import exception
+from utils.executor import blocking
 from utils.constants import EnumBookingStates
 from utils.tools import response, Parameter
 
@@ -32,8 +33,9 @@ class ProfileEntity(Entity):
 		super().__init__(**kwargs)
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def get_coupon_data(cls, **kwargs) -> dict[str, str | dict[str, int]]:
+	def get_coupon_data(cls, **kwargs) -> dict[str, str | dict[str, int]]:
 		"""
 			Get Coupon
 			:param kwargs: dict
@@ -68,10 +70,10 @@ class ProfileEntity(Entity):
 			return response(False, str(e))
 		del kwargs
 
-		if not _identifier in Context:
+		user: cls.User = await Context.get_async(_identifier)
+		if not user:
 			return response(False, Errors.PERMISSION_DENIED)
 
-		user: cls.User = Context[_identifier]
 		today = datetime.now().date()
 
 		expr = [cls.Booking.id_user == user.id]
@@ -97,15 +99,16 @@ class ProfileEntity(Entity):
 			cls.Booking.start,
 		)
 
-		with cls.get_session(commit=False) as session:
+		async with cls.get_async_session(commit=False) as session:
 
 			booking_customers: list[tuple[cls.Booking, cls.User]] = (
-				session.query(cls.Booking, cls.User)
-				.outerjoin(cls.User, cls.Booking.id_user == cls.User.id)
-				.filter(and_(*expr))
-				.order_by(*order_by)
-				.all()
-			)
+				await session.execute(
+					select(cls.Booking, cls.User)
+					.outerjoin(cls.User, cls.Booking.id_user == cls.User.id)
+					.where(and_(*expr))
+					.order_by(*order_by)
+				)
+			).all()
 
 		user_exclude = ('id', 'password', 'valid', 'upd_datetime')
 		_now = datetime.now()
@@ -144,9 +147,9 @@ class ProfileEntity(Entity):
 			return response(False, str(e))
 		del kwargs
 
-		if not _identifier in Context or Context[_identifier].role != cls.Role.ADMIN:
+		user: cls.User = await Context.get_async(_identifier)
+		if not user or user.role != cls.Role.ADMIN:
 			return response(True, Errors.PERMISSION_DENIED)
-		user: cls.User = Context[_identifier]
 
 		expr = [
 			cls.Booking.date >= _date_from,
@@ -177,14 +180,15 @@ class ProfileEntity(Entity):
 			cls.Booking.start,
 		)
 
-		with cls.get_session(commit=False) as session:
+		async with cls.get_async_session(commit=False) as session:
 			booking_customers: list[tuple[cls.Booking, cls.User]] = (
-				session.query(cls.Booking, cls.User)
-				.outerjoin(cls.User, cls.Booking.id_user == cls.User.id)
-				.filter(and_(*expr))
-				.order_by(*order_by)
-				.all()
-			)
+				await session.execute(
+					select(cls.Booking, cls.User)
+					.outerjoin(cls.User, cls.Booking.id_user == cls.User.id)
+					.where(and_(*expr))
+					.order_by(*order_by)
+				)
+			).all()
 
 		booking_exclude = ('upd_datetime', 'id_user', 'id_request', 'upd_user', 'note')
 		user_exclude = ('id', 'password', 'valid', 'upd_datetime', 'birthday', 'instagram', 'role', 'phone', 'email')
@@ -219,10 +223,11 @@ class ProfileEntity(Entity):
 			return response(False, str(e))
 		del kwargs
 
-		if not _identifier in Context or Context[_identifier].role != cls.Role.ADMIN:
+		admin: cls.User = await Context.get_async(_identifier)
+		if not admin or admin.role != cls.Role.ADMIN:
 			return response(True, Errors.PERMISSION_DENIED)
 
-		user: cls.User = cls.User.get(cls.User.id == _id)
+		user: cls.User = await cls.User.get_async(cls.User.id == _id)
 
 		return response(True, '', {'user': user.to_dict()})
 
@@ -245,7 +250,8 @@ class ProfileEntity(Entity):
 			return response(False, str(e))
 		del kwargs
 
-		if not _identifier in Context or Context[_identifier].role != cls.Role.ADMIN:
+		admin: cls.User = await Context.get_async(_identifier)
+		if not admin or admin.role != cls.Role.ADMIN:
 			return response(True, Errors.PERMISSION_DENIED)
 
 		expr = []
@@ -267,7 +273,7 @@ class ProfileEntity(Entity):
 
 		order_by = [cls.User.name, cls.User.surname]
 
-		users: list[cls.User] = cls.User.get_many(and_(*expr), order_by=order_by)
+		users: list[cls.User] = await cls.User.get_many_async(and_(*expr), order_by=order_by)
 
 		exclude_user = ('email', 'password', 'role', 'phone', 'birthday', 'instagram', 'valid', 'upd_datetime')
 
@@ -276,8 +282,9 @@ class ProfileEntity(Entity):
 		})
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def get_user_details(cls, **kwargs) -> dict:
+	def get_user_details(cls, **kwargs) -> dict:
 		"""
 			Get User Details
 			:param kwargs
@@ -311,8 +318,9 @@ class ProfileEntity(Entity):
 		return response(True, '', {'user': user_details})
 
 	@classmethod
+	@blocking
 	@exception(generic_error)
-	async def edit_user(cls, **kwargs) -> dict:
+	def edit_user(cls, **kwargs) -> dict:
 		"""
 			Edit User
 			:param kwargs: dict
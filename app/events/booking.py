@@ -1,26 +1,61 @@
-from sqlalchemy import event
-from asyncio import create_task
+from asgiref.sync import async_to_sync
+from asyncio import run_coroutine_threadsafe
+from datetime import date
+from json import dumps, loads
+from threading import Lock
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 from traceback import format_exc
 
+from app.events.coalescer import EventCoalescer
 from app.models.booking import BookingModel
 from app.services.booking import booking_channel
+from app.services.calendar import CalendarCache
 from app.services.error import ErrorService
-from utils.constants import SQLEvents
+from utils.constants import SQLEvents, ConstBookingGroups
+from utils.env import EventEnv
+from utils.executor import BlockingExecutor
 
 
 class BookingEvent:
+	"""
+		Booking Event
+		The changed bookings are collected per (year, month) on the session and handed over to the coalescer
+		after the commit, then their state is pushed once per month and window to the booking groups:
+			admin: every slot
+			public: the public slots, the others as removed
+			user: the slots of the user, the previous owner of a slot gets its public state
+		With EventEnv.RELOAD_MESSAGES a reload of every month is still sent, until every client applies the deltas
+		ATTRIBUTES:
+			coalescer: EventCoalescer
+			owners: dict[int, set[int]], previous owners of the committed bookings waiting for the coalescer
+		METHODS:
+			register_events: register the listeners
+			record: invalidate the calendar and collect the months of a changed booking
+			add_owners: keep the previous owners of the committed bookings
+			pop_owners: return and drop the previous owners of some bookings
+			slot: return the state of a booking for the consumers
+			send_delta_messages: send the changed slots of every month to the booking groups
+			send_reload_messages: send a reload of every month
+			group_send: send a message to a group of the booking channel
+	"""
+
+	owners: dict[int, set[int]] = {}
+	__lock = Lock()
 
 	@classmethod
 	def register_events(cls):
 		event.listen(BookingModel, SQLEvents.AFTER_INSERT, cls.booking_after_insert)
 		event.listen(BookingModel, SQLEvents.AFTER_UPDATE, cls.booking_after_update)
 		event.listen(BookingModel, SQLEvents.AFTER_DELETE, cls.booking_after_delete)
+		event.listen(Session, SQLEvents.AFTER_COMMIT, cls.session_after_commit)
+		event.listen(Session, SQLEvents.AFTER_SOFT_ROLLBACK, cls.session_after_rollback)
 
 	@staticmethod
 	def booking_after_insert(_, __, target):
 		# noinspection PyBroadException
 		try:
-			BookingEvent.send_reload_message(target)
+			BookingEvent.record(target)
 		except Exception:
 			ErrorService.save_error(format_exc())
 
@@ -28,7 +63,7 @@ class BookingEvent:
 	def booking_after_update(_, __, target):
 		# noinspection PyBroadException
 		try:
-			BookingEvent.send_reload_message(target)
+			BookingEvent.record(target)
 		except Exception:
 			ErrorService.save_error(format_exc())
 
@@ -36,28 +71,154 @@ class BookingEvent:
 	def booking_after_delete(_, __, target):
 		# noinspection PyBroadException
 		try:
-			BookingEvent.send_reload_message(target)
+			BookingEvent.record(target)
 		except Exception:
 			ErrorService.save_error(format_exc())
 
 	@staticmethod
-	def send_reload_message(entity):
-		message = {
-			'type': 'booking.message',
-			'message': {
-				'actionName': 'reload',
-				'result': {
-					'status': True,
-					'message': '',
-					'content': {
-						'id': entity.id,
-						'year': entity.year,
-						'month': entity.month,
-					}
-				}
-			},
-		}
+	def session_after_commit(session):
+		# the release of a savepoint fires after_commit as well, the changes are handed over with the unit of work
+		if session.in_nested_transaction():
+			return
+		# noinspection PyBroadException
 		try:
-			create_task(booking_channel.group_send('events.booking', message))
-		except RuntimeError:
-			pass
+			BookingEvent.add_owners(session.info.pop('booking_owners', {}))
+			for (year, month), ids in session.info.pop('booking', {}).items():
+				CalendarCache.invalidate(year, month)
+				for _id in ids:
+					BookingEvent.coalescer.add((year, month), _id)
+		except Exception:
+			ErrorService.save_error(format_exc())
+
+	@staticmethod
+	def session_after_rollback(session, previous_transaction):
+		# a savepoint rolled back inside a unit of work leaves the changes of the unit to its commit
+		if not previous_transaction.nested:
+			session.info.pop('booking', None)
+			session.info.pop('booking_owners', None)
+
+	@staticmethod
+	def record(entity):
+		"""
+			Invalidate the cached months of the booking, including the previous date on update,
+			and collect them on the session. The months are invalidated again after the commit,
+			so a calendar loaded before the commit is not kept
+		"""
+		months = {(entity.year, entity.month)}
+		months.update((_date.year, _date.month) for _date in inspect(entity).attrs.date.history.deleted if _date)
+		for year, month in months:
+			CalendarCache.invalidate(year, month)
+		owners = {id_user for id_user in inspect(entity).attrs.id_user.history.deleted if id_user}
+
+		session = object_session(entity)
+		if session:
+			changes: dict = session.info.setdefault('booking', {})
+			for month in months:
+				changes.setdefault(month, set()).add(entity.id)
+			if owners:
+				session.info.setdefault('booking_owners', {}).setdefault(entity.id, set()).update(owners)
+		else:
+			BookingEvent.add_owners({entity.id: owners} if owners else {})
+			for month in months:
+				BookingEvent.coalescer.add(month, entity.id)
+
+	@classmethod
+	def add_owners(cls, owners: dict[int, set[int]]):
+		"""
+			Keep the previous owners of the committed bookings until their delta is sent
+			:param owners: dict[int, set[int]]
+		"""
+		if not owners:
+			return
+		with cls.__lock:
+			for _id, id_users in owners.items():
+				cls.owners.setdefault(_id, set()).update(id_users)
+
+	@classmethod
+	def pop_owners(cls, ids: set[int]) -> dict[int, set[int]]:
+		with cls.__lock:
+			return {_id: cls.owners.pop(_id) for _id in ids if _id in cls.owners}
+
+	@staticmethod
+	def slot(booking: BookingModel) -> dict:
+		"""
+			Return the state of a booking for the consumers, serializable by the channel layer
+			:param booking: BookingModel
+			:return: dict
+		"""
+		return {
+			'id': booking.id,
+			'date': booking.date.isoformat(),
+			'start': booking.start.isoformat(),
+			'end': booking.end.isoformat(),
+			'status': booking.status,
+			'id_user': booking.id_user,
+			'booking': loads(dumps(booking.to_dict(CalendarCache.excluded), default=str)),
+		}
+
+	@staticmethod
+	def send_delta_messages(pending: dict[tuple[int, int], list[int]]):
+		ids = {_id for month_ids in pending.values() for _id in month_ids}
+		bookings: dict[int, BookingModel] = {booking.id: booking for booking in BookingModel.get_many(BookingModel.id.in_(ids))}
+		owners = BookingEvent.pop_owners(ids)
+		today = date.today()
+
+		for (year, month), month_ids in pending.items():
+			slots = [BookingEvent.slot(bookings[_id]) if _id in bookings else {'id': _id, 'removed': True} for _id in month_ids]
+			public = [
+				slot if slot['id'] in bookings and CalendarCache.is_public(bookings[slot['id']], today)
+				else {'id': slot['id'], 'removed': True}
+				for slot in slots
+			]
+			users: dict[int, list[dict]] = {}
+			for slot, public_slot in zip(slots, public):
+				if slot.get('id_user'):
+					users.setdefault(slot['id_user'], []).append(slot)
+				for id_user in owners.get(slot['id'], set()) - {slot.get('id_user')}:
+					users.setdefault(id_user, []).append(public_slot)
+
+			# the user groups are sent after the public one, so the own slots removed from the public view are restored
+			message = {'type': 'booking.delta', 'year': year, 'month': month}
+			BookingEvent.group_send(ConstBookingGroups.ADMIN, {**message, 'slots': slots})
+			BookingEvent.group_send(ConstBookingGroups.PUBLIC, {**message, 'slots': public})
+			for id_user, user_slots in users.items():
+				BookingEvent.group_send(ConstBookingGroups.USER.format(id_user=id_user), {**message, 'slots': user_slots})
+
+		if EventEnv.RELOAD_MESSAGES:
+			BookingEvent.send_reload_messages(pending)
+
+	@staticmethod
+	def send_reload_messages(pending: dict[tuple[int, int], list[int]]):
+		for (year, month), ids in pending.items():
+			BookingEvent.group_send(ConstBookingGroups.RELOAD, {
+				'type': 'booking.message',
+				'message': {
+					'actionName': 'reload',
+					'result': {
+						'status': True,
+						'message': '',
+						'content': {
+							'id': ids[-1],
+							'ids': ids,
+							'year': year,
+							'month': month,
+						}
+					}
+				},
+			})
+
+	@staticmethod
+	def group_send(group: str, message: dict):
+		"""
+			Send a message to a group, on the event loop serving the consumers when there is one
+			:param group: str
+			:param message: dict
+		"""
+		loop = BlockingExecutor.loop
+		if loop and loop.is_running():
+			run_coroutine_threadsafe(booking_channel.group_send(group, message), loop).result(EventEnv.SEND_TIMEOUT)
+		else:
+			async_to_sync(booking_channel.group_send)(group, message)
+
+
+BookingEvent.coalescer = EventCoalescer(EventEnv.COALESCE_WINDOW, BookingEvent.send_delta_messages)
@@ -0,0 +1,51 @@
+from threading import Lock, Timer
+from traceback import format_exc
+from typing import Callable, Hashable
+
+from app.services.error import ErrorService
+
+
+class EventCoalescer:
+	"""
+		Collect the ids changed per key and hand them over together once the window is elapsed.
+		The flush runs on a timer thread, so it does not depend on a running event loop
+		ATTRIBUTES:
+			window: float, seconds
+			callback: Callable[[dict[Hashable, list[int]]], None]
+			pending: dict[Hashable, dict[int, None]], ids in insertion order
+		METHODS:
+			add: add an id to a key
+			flush: hand over the pending ids
+	"""
+
+	def __init__(self, window: float, callback: Callable[[dict[Hashable, list[int]]], None]):
+		self.window = window
+		self.callback = callback
+		self.pending = {}
+		self.__timer: Timer = None
+		self.__lock = Lock()
+
+	def add(self, key: Hashable, _id: int):
+		"""
+			Add an id to a key, the first id of a window arms the timer
+			:param key: Hashable
+			:param _id: int
+		"""
+		with self.__lock:
+			self.pending.setdefault(key, {})[_id] = None
+			if self.__timer is None:
+				self.__timer = Timer(self.window, self.flush)
+				self.__timer.daemon = True
+				self.__timer.start()
+
+	def flush(self):
+		with self.__lock:
+			pending, self.pending = self.pending, {}
+			self.__timer = None
+		if not pending:
+			return
+		# noinspection PyBroadException
+		try:
+			self.callback({key: list(ids) for key, ids in pending.items()})
+		except Exception:
+			ErrorService.save_error(format_exc())
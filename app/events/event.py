@@ -1,7 +1,13 @@
 from app.events.booking import BookingEvent
+from app.events.home import HomeEvent
+from app.events.mail import MailEvent
 
 class Event:
 	booking = BookingEvent
+	home = HomeEvent
+	mail = MailEvent
 	@classmethod
 	def start_process(cls):
 		cls.booking.register_events()
+		cls.home.register_events()
+		cls.mail.register_events()
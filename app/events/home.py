@@ -0,0 +1,54 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.models.view import ViewHomeModel
+from app.services.home import HomeCache
+from utils.constants import SQLEvents
+
+
+class HomeEvent:
+	"""
+		Home Event
+		A change of the home rows through the ORM is marked on the session and the home snapshot of the process
+		is dropped after the commit, so a reader can not cache the rows of before the commit.
+		The other processes see the change at their next check of the stamp
+		METHODS:
+			register_events: register the listeners
+			record: mark a changed home row on its session
+	"""
+
+	@classmethod
+	def register_events(cls):
+		event.listen(ViewHomeModel, SQLEvents.AFTER_INSERT, cls.home_after_change)
+		event.listen(ViewHomeModel, SQLEvents.AFTER_UPDATE, cls.home_after_change)
+		event.listen(ViewHomeModel, SQLEvents.AFTER_DELETE, cls.home_after_change)
+		event.listen(Session, SQLEvents.AFTER_COMMIT, cls.session_after_commit)
+		event.listen(Session, SQLEvents.AFTER_SOFT_ROLLBACK, cls.session_after_rollback)
+
+	@staticmethod
+	def home_after_change(_, __, target):
+		HomeEvent.record(target)
+
+	@staticmethod
+	def session_after_commit(session):
+		# the release of a savepoint fires after_commit as well, the snapshot is dropped with the unit of work
+		if session.in_nested_transaction():
+			return
+		if session.info.pop('home', False):
+			HomeCache.invalidate()
+
+	@staticmethod
+	def session_after_rollback(session, previous_transaction):
+		if not previous_transaction.nested:
+			session.info.pop('home', None)
+
+	@staticmethod
+	def record(entity):
+		"""
+			Mark a changed home row on its session, the snapshot is dropped at once without a session
+		"""
+		session = object_session(entity)
+		if session:
+			session.info['home'] = True
+		else:
+			HomeCache.invalidate()
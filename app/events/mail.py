@@ -0,0 +1,105 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from traceback import format_exc
+
+from app.cronjobs.jobs.mail import MailJob
+from app.events.coalescer import EventCoalescer
+from app.models.action import ActionModel
+from app.models.confirmation import ConfirmationModel
+from app.models.mail import MailModel
+from app.services.error import ErrorService
+from app.services.mail import MailService
+from utils.constants import SQLEvents, EnumConfirmationType, EnumActionType
+from utils.env import EventEnv
+
+
+class MailEvent:
+	"""
+		Mail Event
+		The inserted confirmations, actions and mails are collected on the session and handed over to the coalescer
+		after the commit, then the matching mails are generated and sent once per window.
+		The mails inserted by the generation are collected again, so they are sent in the next window.
+		The cronjobs are left as sweepers of what is not triggered by an insert
+		ATTRIBUTES:
+			generators: dict[str, str], MailService method generating the mails of each confirmation and action type
+			send: str, key of the inserted mails
+			coalescer: EventCoalescer
+		METHODS:
+			register_events: register the listeners
+			record: collect the generator of an inserted row
+			generate_mails: generate the mails and send the inserted ones
+	"""
+
+	generators: dict[str, str] = {
+		EnumConfirmationType.ACCEPT_BOOKING: 'generate_booked_mail',
+		EnumConfirmationType.CONFIRM_BOOKING: 'generate_confirmed_mail',
+		EnumActionType.NEW_BOOKING: 'generate_new_booking_mail',
+		EnumActionType.CONFIRM_EMAIL: 'generate_confirm_email_mail',
+		EnumActionType.JOIN_ACCOUNT: 'generate_join_account_mail',
+		EnumActionType.REQUEST_NEW_BOOKING: 'generate_new_request_booking_mail',
+		EnumActionType.FORGOT_PASSWORD: 'generate_forgot_password_mail',
+	}
+	send = 'send'
+
+	@classmethod
+	def register_events(cls):
+		if not EventEnv.MAIL_EVENTS:
+			return
+		event.listen(ConfirmationModel, SQLEvents.AFTER_INSERT, cls.after_insert)
+		event.listen(ActionModel, SQLEvents.AFTER_INSERT, cls.after_insert)
+		event.listen(MailModel, SQLEvents.AFTER_INSERT, cls.after_insert)
+		event.listen(Session, SQLEvents.AFTER_COMMIT, cls.session_after_commit)
+		event.listen(Session, SQLEvents.AFTER_SOFT_ROLLBACK, cls.session_after_rollback)
+
+	@staticmethod
+	def after_insert(_, __, target):
+		# noinspection PyBroadException
+		try:
+			MailEvent.record(target)
+		except Exception:
+			ErrorService.save_error(format_exc())
+
+	@staticmethod
+	def session_after_commit(session):
+		# the release of a savepoint fires after_commit as well, the changes are handed over with the unit of work
+		if session.in_nested_transaction():
+			return
+		# noinspection PyBroadException
+		try:
+			for key, _id in session.info.pop('mail', {}).items():
+				MailEvent.coalescer.add(key, _id)
+		except Exception:
+			ErrorService.save_error(format_exc())
+
+	@staticmethod
+	def session_after_rollback(session, previous_transaction):
+		# a savepoint rolled back inside a unit of work leaves the changes of the unit to its commit
+		if not previous_transaction.nested:
+			session.info.pop('mail', None)
+
+	@staticmethod
+	def record(entity):
+		"""
+			Collect the generator of an inserted row on its session, mails are collected for sending
+		"""
+		key = MailEvent.send if isinstance(entity, MailModel) else MailEvent.generators.get(entity.type)
+		if key is None:
+			return
+
+		session = object_session(entity)
+		if session:
+			session.info.setdefault('mail', {})[key] = entity.id
+		else:
+			MailEvent.coalescer.add(key, entity.id)
+
+	@staticmethod
+	def generate_mails(pending: dict[str, list[int]]):
+		for key in pending:
+			if key != MailEvent.send:
+				getattr(MailService, key)()
+
+		if MailEvent.send in pending:
+			MailJob().main()
+
+
+MailEvent.coalescer = EventCoalescer(EventEnv.MAIL_WINDOW, MailEvent.generate_mails)
@@ -1,14 +1,25 @@
-from contextlib import contextmanager
-from sqlalchemy import create_engine, Engine, NullPool
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, inspect, select, text, Engine, Enum
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker, DeclarativeBase
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.schema import CreateColumn
+from traceback import format_exc
 from typing import Sequence
 
+from app.models.pool import pool_options, listen_pool
+from app.models.slowlog import SlowStatementLog
+from app.models.tracer import StatementTracer
 from app.models.utils import _repr
 from utils.env import DatabaseEnv
+from utils.tools import print_error
 
 
 Base: DeclarativeBase = declarative_base()
+current_session: ContextVar[Session | None] = ContextVar('current_session', default=None)
 
 
 class SessionModel:
@@ -16,14 +27,50 @@ class SessionModel:
 		Base Session
 		ATTRIBUTES:
 			engine: Engine
+			session_factory: sessionmaker
+			async_engine: AsyncEngine
+			async_session_factory: async_sessionmaker
 	"""
-	engine: Engine = create_engine(f'{DatabaseEnv.DIALECT}://{DatabaseEnv.USER}:{DatabaseEnv.PASS}@{DatabaseEnv.HOST}:{DatabaseEnv.PORT}/{DatabaseEnv.NAME}', poolclass=NullPool)
+	engine: Engine = SlowStatementLog.listen(StatementTracer.listen(listen_pool(
+		create_engine(f'{DatabaseEnv.DIALECT}://{DatabaseEnv.USER}:{DatabaseEnv.PASS}@{DatabaseEnv.HOST}:{DatabaseEnv.PORT}/{DatabaseEnv.NAME}', **pool_options('sync')),
+		'sync'
+	)))
+	session_factory: sessionmaker = sessionmaker(bind=engine, expire_on_commit=False)
+	async_engine: AsyncEngine = create_async_engine(f'{DatabaseEnv.ASYNC_DIALECT}://{DatabaseEnv.USER}:{DatabaseEnv.PASS}@{DatabaseEnv.HOST}:{DatabaseEnv.PORT}/{DatabaseEnv.NAME}', **pool_options('async', AsyncAdaptedQueuePool))
+	SlowStatementLog.listen(StatementTracer.listen(listen_pool(async_engine.sync_engine, 'async')))
+	async_session_factory: async_sessionmaker = async_sessionmaker(bind=async_engine, expire_on_commit=False)
 	Base.metadata.create_all(engine)
 
 	@staticmethod
 	@contextmanager
-	def get_session(commit=True) -> Session:
-		session = sessionmaker(bind=SessionModel.engine, expire_on_commit=False)()
+	def get_session(commit=True, shared=True) -> Session:
+		"""
+			Get Session, inside a unit of work the session of the unit is returned and committed once at the end.
+			A writing block is wrapped in a savepoint, so if it raises or is rolled back only its own work is dropped,
+			as with an own session. The reading blocks (commit False) join the unit without the extra round trips
+			:param commit: bool
+			:param shared: bool, False to get an own session even inside a unit of work
+			:return: Session
+		"""
+		session = current_session.get() if shared else None
+		if session is not None and not commit:
+			yield session
+			return
+		if session is not None:
+			savepoint = session.begin_nested()
+			try:
+				yield session
+				if savepoint.is_active:
+					savepoint.commit()
+				elif session.get_nested_transaction() is savepoint:
+					savepoint.rollback()
+			except Exception:
+				if session.get_nested_transaction() is savepoint:
+					savepoint.rollback()
+				raise
+			return
+
+		session = SessionModel.session_factory()
 		try:
 			yield session
 			if commit:
@@ -34,6 +81,108 @@ class SessionModel:
 		finally:
 			session.close()
 
+	@staticmethod
+	def rollback(session: Session):
+		"""
+			Roll back the work of the current get_session block, inside a unit of work only its savepoint is rolled back
+			:param session: Session
+		"""
+		savepoint = session.get_nested_transaction() if session is current_session.get() else None
+		if savepoint is not None:
+			savepoint.rollback()
+		else:
+			session.rollback()
+
+	@staticmethod
+	@contextmanager
+	def unit_of_work() -> Session:
+		"""
+			Open a session shared by every get_session of the current context, committed once at the end.
+			A unit of work opened inside another one joins it
+			:return: Session
+		"""
+		if current_session.get() is not None:
+			yield current_session.get()
+			return
+
+		session = SessionModel.session_factory()
+		token = current_session.set(session)
+		try:
+			yield session
+			session.commit()
+		except Exception:
+			session.rollback()
+			raise
+		finally:
+			current_session.reset(token)
+			session.close()
+
+	@staticmethod
+	def create_indexes():
+		"""
+			Create the indexes declared on the models that are missing in the database,
+			create_all does not add them to tables that already exist.
+			A unique index failing on the existing rows is reported and skipped, so the startup goes on
+		"""
+		for table in Base.metadata.sorted_tables:
+			for index in table.indexes:
+				try:
+					index.create(SessionModel.engine, checkfirst=True)
+				except IntegrityError:
+					print_error(f'Index {index.name} not created:\n{format_exc()}')
+
+	@staticmethod
+	def create_columns():
+		"""
+			Add the columns declared on the models that are missing in the tables that already exist,
+			create_all does not alter them. The added columns must be nullable or have a server default
+		"""
+		inspector = inspect(SessionModel.engine)
+		with SessionModel.engine.begin() as connection:
+			for table in Base.metadata.sorted_tables:
+				if not inspector.has_table(table.name):
+					continue
+				existing = {column['name'] for column in inspector.get_columns(table.name)}
+				for column in table.columns:
+					if column.name not in existing:
+						dialect = SessionModel.engine.dialect
+						ddl = CreateColumn(column).compile(dialect=dialect)
+						connection.execute(text(f'ALTER TABLE {dialect.identifier_preparer.format_table(table)} ADD COLUMN {ddl}'))
+
+	@staticmethod
+	def create_enum_values():
+		"""
+			Add the values declared on the models that are missing in the postgresql enum types,
+			create_all does not alter the types that already exist
+		"""
+		if SessionModel.engine.dialect.name != 'postgresql':
+			return
+		types: dict[str, list[str]] = {
+			column.type.name: column.type.enums
+			for table in Base.metadata.sorted_tables
+			for column in table.columns
+			if isinstance(column.type, Enum) and column.type.name
+		}
+		with SessionModel.engine.connect() as connection:
+			connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+			for name, values in types.items():
+				for value in values:
+					connection.execute(text(f"ALTER TYPE {name} ADD VALUE IF NOT EXISTS '{value}'"))
+
+	@staticmethod
+	@asynccontextmanager
+	async def get_async_session(commit=True) -> AsyncSession:
+		session = SessionModel.async_session_factory()
+		try:
+			yield session
+			if commit:
+				await session.commit()
+		except Exception:
+			await session.rollback()
+			raise
+		finally:
+			await session.close()
+
 
 class Model(SessionModel):
 	"""
@@ -44,6 +193,10 @@ class Model(SessionModel):
 			get_all: get all models
 			get: get models by expression
 			set: add entity to session
+			get_all_async: get all models on the async session
+			get_async: get model by expression on the async session
+			get_many_async: get models by expression on the async session
+			save_async: add entity to the async session
 	"""
 
 	@classmethod
@@ -94,6 +247,47 @@ class Model(SessionModel):
 		with self.get_session() as session:
 			session.add(self)
 
+	@classmethod
+	async def get_all_async(cls) -> list['Model']:
+		"""
+			Get all models
+			:return: models
+		"""
+		async with cls.get_async_session(commit=False) as session:
+			return list((await session.scalars(select(cls))).all())
+
+	@classmethod
+	async def get_async(cls, expr):
+		"""
+			Get entity by expression
+			:param expr: expression
+
+			:return: Model
+		"""
+		async with cls.get_async_session(commit=False) as session:
+			return await session.scalar(select(cls).where(expr).limit(1))
+
+	@classmethod
+	async def get_many_async(cls, expr, order_by=None) -> list['Model']:
+		"""
+			Get models by expression
+			:param expr: expression
+			:param order_by: order by
+			:return: models
+		"""
+		async with cls.get_async_session(commit=False) as session:
+			query = select(cls).where(expr)
+			if order_by:
+				query = query.order_by(*order_by)
+			return list((await session.scalars(query)).all())
+
+	async def save_async(self):
+		"""
+			Add entity to the async session
+		"""
+		async with self.get_async_session() as session:
+			session.add(self)
+
 	def to_dict(self, exclude: Sequence[str] = None) -> dict:
 		"""
 			Return a dict from a result object.
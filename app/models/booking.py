@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from sqlalchemy import Column, Date, ForeignKey, Text, DateTime, Time, Integer, String
+from sqlalchemy import Column, Date, ForeignKey, Text, DateTime, Time, Integer, String, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import deferred
 from typing import Sequence
@@ -25,6 +25,10 @@ class BookingModel(Model, Base):
 	"""
 
 	__tablename__ = 'booking'
+	__table_args__ = (
+		Index('ix_booking_date_status_start', 'date', 'status', 'start'),
+		Index('ix_booking_free', 'date', 'start', postgresql_where=text(f"id_user IS NULL AND status = '{EnumBookingStates.FREE}'")),
+	)
 
 	id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
 	date = Column(Date, nullable=False)
@@ -1,11 +1,16 @@
+from atexit import register
+from hashlib import sha1
+from re import compile as re_compile
+from threading import Event, Lock, Thread
 from traceback import format_exc
-from sqlalchemy import Column, Text, DateTime, Integer
+from sqlalchemy import Column, Text, DateTime, Integer, String, Index, text
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql import func
 from sqlalchemy.orm import deferred
 
 from app.models.base import Model, Base
 from utils.tools import print_error
-from utils.env import SettingsEnv
+from utils.env import SettingsEnv, ErrorEnv
 
 
 class ErrorModel(Model, Base):
@@ -14,13 +19,20 @@ class ErrorModel(Model, Base):
 		ATTRIBUTES:
 			id: Integer
 			error: Text
-			upd_datetime: DateTime
+			fingerprint: String(40), digest of the error without its numbers
+			count: Integer, occurrences of the fingerprint
+			upd_datetime: DateTime, last occurrence
 	"""
 
 	__tablename__ = 'errors'
+	__table_args__ = (
+		Index('ix_errors_fingerprint', 'fingerprint', unique=True),
+	)
 
 	id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
 	error = Column(Text, nullable=False)
+	fingerprint = Column(String(40), nullable=True)
+	count = Column(Integer, nullable=False, server_default=text('1'))
 	upd_datetime = deferred(Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now()))
 
 	def __init__(self, error, update_time = func.now()):
@@ -29,7 +41,7 @@ class ErrorModel(Model, Base):
 		self.upd_datetime = update_time
 
 	@classmethod
-	def save_error(cls, error: str):
+	def save_error(cls, error: str | bytes):
 		# noinspection PyBroadException
 		try:
 			if not error:
@@ -37,6 +49,130 @@ class ErrorModel(Model, Base):
 			if SettingsEnv.RUNNING_MODE.is_dev:
 				print_error(error)
 			else:
-				cls(error).save()
+				ErrorSink.put(error)
 		except:
 			print_error(format_exc())
+
+
+class ErrorSink:
+	"""
+		Bounded buffer of the errors, drained by a background writer with one upsert per batch.
+		The errors are grouped by fingerprint, a repeated error increases the count of its row instead of adding one
+		ATTRIBUTES:
+			numbers: Pattern, numbers and addresses left out of the fingerprint
+			pending: dict[str, list], error and occurrences of every fingerprint waiting to be written
+			written: int
+			dropped: int, errors of new fingerprints refused while the buffer was full
+			failed: int, errors lost on a failed write or not convertible to text
+		METHODS:
+			normalize: return an error as text
+			fingerprint: return the fingerprint of an error
+			put: buffer an error
+			flush: write the buffered errors
+			stats: return the counters
+	"""
+
+	numbers = re_compile(r'0x[0-9a-fA-F]+|\d+')
+	pending: dict[str, list] = {}
+	written: int = 0
+	dropped: int = 0
+	failed: int = 0
+	__lock = Lock()
+	__wake = Event()
+	__writer: Thread = None
+
+	@staticmethod
+	def normalize(error) -> str:
+		"""
+			Return an error as text, the smtp errors are bytes
+			:param error: str | bytes | object
+			:return: str
+		"""
+		if isinstance(error, (bytes, bytearray)):
+			return bytes(error).decode('utf-8', 'replace')
+		return error if isinstance(error, str) else str(error)
+
+	@classmethod
+	def fingerprint(cls, error: str) -> str:
+		return sha1(cls.numbers.sub('#', error).encode()).hexdigest()
+
+	@classmethod
+	def put(cls, error):
+		"""
+			Buffer an error, the writer is started on the first one.
+			An error that can not be converted to text is counted as failed
+			:param error: str | bytes | object
+		"""
+		# noinspection PyBroadException
+		try:
+			error = cls.normalize(error)
+			fingerprint = cls.fingerprint(error)
+		except Exception:
+			with cls.__lock:
+				cls.failed += 1
+			print_error(format_exc())
+			return
+
+		with cls.__lock:
+			if fingerprint in cls.pending:
+				cls.pending[fingerprint][1] += 1
+			elif len(cls.pending) < ErrorEnv.QUEUE_SIZE:
+				cls.pending[fingerprint] = [error, 1]
+			else:
+				cls.dropped += 1
+				return
+
+			if cls.__writer is None:
+				cls.__writer = Thread(target=cls.__write, name='error-sink', daemon=True)
+				cls.__writer.start()
+				register(cls.flush)
+			if len(cls.pending) >= ErrorEnv.BATCH_SIZE:
+				cls.__wake.set()
+
+	@classmethod
+	def __write(cls):
+		while True:
+			cls.__wake.wait(ErrorEnv.FLUSH_INTERVAL)
+			cls.__wake.clear()
+			cls.flush()
+
+	@classmethod
+	def flush(cls):
+		with cls.__lock:
+			pending, cls.pending = cls.pending, {}
+		if not pending:
+			return
+
+		rows = [
+			{'error': error, 'fingerprint': fingerprint, 'count': count}
+			for fingerprint, (error, count) in pending.items()
+		]
+		# noinspection PyBroadException
+		try:
+			with ErrorModel.get_session(shared=False) as session:
+				for start in range(0, len(rows), ErrorEnv.BATCH_SIZE):
+					statement = insert(ErrorModel).values(rows[start:start + ErrorEnv.BATCH_SIZE])
+					session.execute(statement.on_conflict_do_update(
+						index_elements=[ErrorModel.fingerprint],
+						set_={
+							'error': statement.excluded.error,
+							'count': ErrorModel.count + statement.excluded.count,
+							'upd_datetime': func.now(),
+						}
+					))
+			with cls.__lock:
+				cls.written += sum(row['count'] for row in rows)
+		except Exception:
+			with cls.__lock:
+				cls.failed += sum(row['count'] for row in rows)
+			print_error(format_exc())
+
+	@classmethod
+	def stats(cls) -> dict[str, int]:
+		with cls.__lock:
+			return {
+				'pending': sum(count for _, count in cls.pending.values()),
+				'written': cls.written,
+				'dropped': cls.dropped,
+				'failed': cls.failed,
+			}
@@ -0,0 +1,154 @@
+from sqlalchemy import event, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool, NullPool
+from threading import Lock
+from time import perf_counter
+
+from utils.env import DatabaseEnv
+
+
+class PoolMetrics:
+	"""
+		Pool Metrics
+		ATTRIBUTES:
+			name: str
+			checkouts: int
+			checkins: int
+			connects: int
+			timeouts: int
+			wait_total: float
+			wait_max: float
+		METHODS:
+			get: get (or create) the metrics of a pool by name
+			add_checkout: record a checkout and its wait time
+			add_timeout: record a checkout that timed out
+			add_checkin: record a checkin
+			add_connect: record a new DBAPI connection
+			snapshot: return the counters as dict
+	"""
+
+	registry: dict[str, 'PoolMetrics'] = {}
+
+	def __init__(self, name: str):
+		self.name = name
+		self.checkouts = 0
+		self.checkins = 0
+		self.connects = 0
+		self.timeouts = 0
+		self.wait_total = 0.0
+		self.wait_max = 0.0
+		self.engine: Engine = None
+		self.__lock = Lock()
+
+	@classmethod
+	def get(cls, name: str) -> 'PoolMetrics':
+		if name not in cls.registry:
+			cls.registry[name] = cls(name)
+		return cls.registry[name]
+
+	def add_checkout(self, wait: float):
+		with self.__lock:
+			self.checkouts += 1
+			self.wait_total += wait
+			self.wait_max = max(self.wait_max, wait)
+
+	def add_timeout(self, wait: float):
+		with self.__lock:
+			self.timeouts += 1
+			self.wait_total += wait
+			self.wait_max = max(self.wait_max, wait)
+
+	def add_checkin(self):
+		with self.__lock:
+			self.checkins += 1
+
+	def add_connect(self):
+		with self.__lock:
+			self.connects += 1
+
+	def snapshot(self) -> dict[str, int | float]:
+		"""
+			Return the counters as dict
+			:return: dict
+		"""
+		with self.__lock:
+			snapshot = {
+				'checkouts': self.checkouts,
+				'checkins': self.checkins,
+				'in_use': self.checkouts - self.checkins,
+				'connects': self.connects,
+				'timeouts': self.timeouts,
+				'wait_total': round(self.wait_total, 6),
+				'wait_avg': round(self.wait_total / self.checkouts, 6) if self.checkouts else 0.0,
+				'wait_max': round(self.wait_max, 6),
+			}
+		if self.engine and isinstance(self.engine.pool, QueuePool):
+			snapshot.update({
+				'size': self.engine.pool.size(),
+				'checked_out': self.engine.pool.checkedout(),
+				'overflow': self.engine.pool.overflow(),
+			})
+		return snapshot
+
+
+class MeteredPool(Pool):
+	"""
+		Pool mixin that times every checkout, including the time spent waiting for a free connection
+		ATTRIBUTES:
+			metrics: PoolMetrics
+	"""
+
+	metrics: PoolMetrics = None
+
+	def connect(self):
+		start = perf_counter()
+		try:
+			connection = super().connect()
+		except PoolTimeoutError:
+			self.metrics.add_timeout(perf_counter() - start)
+			raise
+		self.metrics.add_checkout(perf_counter() - start)
+		return connection
+
+
+def metered(pool_class: type[Pool], name: str) -> type[Pool]:
+	"""
+		Return a metered subclass of pool_class bound to the metrics of name
+		:param pool_class: type[Pool]
+		:param name: str
+		:return: type[Pool]
+	"""
+	return type(f'Metered{pool_class.__name__}', (MeteredPool, pool_class), {'metrics': PoolMetrics.get(name)})
+
+
+def pool_options(name: str, queue_class: type[QueuePool] = QueuePool) -> dict:
+	"""
+		Return the create_engine pool options driven by DatabaseEnv
+		:param name: str
+		:param queue_class: type[QueuePool]
+		:return: dict
+	"""
+	if DatabaseEnv.POOL_MODE == 'NULL':
+		return {'poolclass': metered(NullPool, name)}
+	return {
+		'poolclass': metered(queue_class, name),
+		'pool_size': DatabaseEnv.POOL_SIZE,
+		'max_overflow': DatabaseEnv.POOL_MAX_OVERFLOW,
+		'pool_timeout': DatabaseEnv.POOL_TIMEOUT,
+		'pool_recycle': DatabaseEnv.POOL_RECYCLE,
+		'pool_pre_ping': DatabaseEnv.POOL_PRE_PING,
+	}
+
+
+def listen_pool(engine: Engine, name: str) -> Engine:
+	"""
+		Register the checkin/connect listeners of the metrics of name on engine
+		:param engine: Engine
+		:param name: str
+		:return: Engine
+	"""
+	metrics = PoolMetrics.get(name)
+	metrics.engine = engine
+	event.listen(engine, 'checkin', lambda *_: metrics.add_checkin())
+	event.listen(engine, 'connect', lambda *_: metrics.add_connect())
+	return engine
@@ -0,0 +1,237 @@
+from datetime import datetime
+from json import dumps
+from logging import getLogger, Formatter, Logger
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from queue import Queue, Full
+from re import compile as re_compile, IGNORECASE
+from sys import _getframe
+from threading import Thread, Lock
+from time import perf_counter, monotonic
+from traceback import format_exc
+
+from sqlalchemy import event, text, Engine
+
+from app.models.tracer import StatementTracer
+from utils.env import SlowLogEnv
+from utils.tools import print_error
+
+
+class SlowStatementLog:
+	"""
+		Opt-in log of the statements slower than SlowLogEnv.THRESHOLD, written as json lines to a rotating file.
+		Every entry holds the bound parameters and the project frames that issued the statement,
+		the parameters of the statements on the tables holding personal data and codes are masked.
+		with SlowLogEnv.EXPLAIN the plan of the slow selects is captured with EXPLAIN (ANALYZE, BUFFERS),
+		at most once per shape every SlowLogEnv.EXPLAIN_INTERVAL seconds.
+		The request thread only measures and enqueues, the plans and the file are handled by a background writer
+		ATTRIBUTES:
+			root: str, frames under root and outside the libraries are reported as origin
+			locking: Pattern, row locking clauses, the selects holding them are not explained
+			sensitive: Pattern, tables whose parameters are masked
+			queue: Queue, entries waiting for the writer
+			explained: dict[str, float], monotonic time of the last plan of each shape
+			logged: int
+			dropped: int
+		METHODS:
+			listen: register the cursor listeners on an engine
+			origin: return the project frames issuing the current statement
+			record: enqueue a slow statement
+			mask: return the parameters to log for a statement
+			explainable: return True if the plan of an entry has to be captured
+			explain: return the plan of a statement
+			write: write an entry to the file
+			stats: return the counters as dict
+	"""
+
+	root = str(Path(__file__).resolve().parents[2])
+	locking = re_compile(r'\bFOR\s+(NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b', IGNORECASE)
+	sensitive = re_compile(r'\b(users|actions|confirmations)\b', IGNORECASE)
+	queue: Queue = Queue(maxsize=SlowLogEnv.QUEUE_SIZE)
+	explained: dict[str, float] = {}
+	logged: int = 0
+	dropped: int = 0
+	__logger: Logger = None
+	__writer: Thread = None
+	__lock = Lock()
+
+	@classmethod
+	def listen(cls, engine: Engine) -> Engine:
+		"""
+			Register the cursor listeners on engine, only if a threshold is set
+			:param engine: Engine
+			:return: Engine
+		"""
+		if SlowLogEnv.THRESHOLD > 0:
+			event.listen(engine, 'before_cursor_execute', cls.before_cursor_execute)
+			event.listen(engine, 'after_cursor_execute', cls.after_cursor_execute)
+		return engine
+
+	@staticmethod
+	def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+		# the start is kept on the execution context, so a failed statement leaves nothing behind on the connection
+		context.slow_started = perf_counter()
+
+	@staticmethod
+	def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+		started = getattr(context, 'slow_started', None)
+		if started is None:
+			return
+		elapsed = perf_counter() - started
+		if elapsed > SlowLogEnv.THRESHOLD and connection.get_execution_options().get('slow_log', True):
+			# noinspection PyBroadException
+			try:
+				SlowStatementLog.record(connection.engine, statement, parameters, elapsed, executemany)
+			except Exception:
+				print_error(format_exc())
+
+	@classmethod
+	def origin(cls) -> list[str]:
+		"""
+			Return the project frames issuing the current statement, innermost first
+			:return: list[str]
+		"""
+		frames = []
+		frame = _getframe(1)
+		while frame is not None:
+			filename = frame.f_code.co_filename
+			if filename.startswith(cls.root) and 'site-packages' not in filename and filename != __file__:
+				frames.append(f'{frame.f_code.co_qualname} ({filename[len(cls.root) + 1:]}:{frame.f_lineno})')
+			frame = frame.f_back
+		return frames
+
+	@classmethod
+	def record(cls, engine: Engine, statement: str, parameters, elapsed: float, executemany: bool = False):
+		"""
+			Enqueue a slow statement for the writer, dropped if the queue is full
+			:param engine: Engine
+			:param statement: str
+			:param parameters: dict | tuple | list
+			:param elapsed: float
+			:param executemany: bool
+		"""
+		trace = StatementTracer.current.get()
+		parameters = parameters[:10] if executemany else parameters
+		entry = {
+			'datetime': datetime.now().isoformat(),
+			'elapsed': round(elapsed, 6),
+			'action': trace.name if trace else None,
+			'origin': cls.origin(),
+			'statement': statement,
+			'parameters': cls.mask(statement, parameters),
+			'executemany': executemany,
+		}
+		try:
+			cls.queue.put_nowait((engine, entry, parameters))
+		except Full:
+			with cls.__lock:
+				cls.dropped += 1
+			return
+
+		with cls.__lock:
+			if cls.__writer is None:
+				cls.__writer = Thread(target=cls.__write, name='slow-log', daemon=True)
+				cls.__writer.start()
+
+	@classmethod
+	def mask(cls, statement: str, parameters):
+		"""
+			Return the parameters to log, masked if the statement touches users, actions or confirmations
+			:param statement: str
+			:param parameters: dict | tuple | list
+			:return: dict | tuple | list
+		"""
+		if not cls.sensitive.search(statement):
+			return parameters
+		return cls.__masked(parameters)
+
+	@classmethod
+	def __masked(cls, value):
+		if isinstance(value, dict):
+			return {key: cls.__masked(item) for key, item in value.items()}
+		if isinstance(value, (list, tuple)):
+			return [cls.__masked(item) for item in value]
+		return None if value is None else '***'
+
+	@classmethod
+	def __write(cls):
+		while True:
+			engine, entry, parameters = cls.queue.get()
+			# noinspection PyBroadException
+			try:
+				if cls.explainable(engine, entry):
+					entry['plan'] = cls.explain(engine, entry['statement'], parameters)
+			except Exception:
+				entry['plan'] = format_exc().splitlines()[-1]
+			# noinspection PyBroadException
+			try:
+				cls.write(entry)
+			except Exception:
+				print_error(format_exc())
+
+	@classmethod
+	def explainable(cls, engine: Engine, entry: dict) -> bool:
+		"""
+			Return True if the plan of the entry has to be captured: a single plain select, without row locks,
+			on a sync postgresql engine whose shape was not explained in the last SlowLogEnv.EXPLAIN_INTERVAL seconds.
+			WITH statements are left out, a data modifying CTE would be run again by ANALYZE
+			:param engine: Engine
+			:param entry: dict
+			:return: bool
+		"""
+		if not SlowLogEnv.EXPLAIN or entry['executemany'] or engine.dialect.name != 'postgresql' or engine.dialect.is_async:
+			return False
+		if not entry['statement'].lstrip().upper().startswith('SELECT') or cls.locking.search(entry['statement']):
+			return False
+
+		shape = StatementTracer.shape(entry['statement'])
+		now = monotonic()
+		if now - cls.explained.get(shape, -SlowLogEnv.EXPLAIN_INTERVAL) < SlowLogEnv.EXPLAIN_INTERVAL:
+			return False
+		cls.explained[shape] = now
+		return True
+
+	@staticmethod
+	def explain(engine: Engine, statement: str, parameters) -> list[str]:
+		"""
+			Return the plan of a statement, run on an own connection in a transaction rolled back at the end
+			:param engine: Engine
+			:param statement: str
+			:param parameters: dict | tuple
+			:return: list[str]
+		"""
+		with engine.connect() as connection:
+			connection = connection.execution_options(slow_log=False)
+			with connection.begin() as transaction:
+				connection.execute(text(f'SET LOCAL statement_timeout = {int(SlowLogEnv.EXPLAIN_TIMEOUT)}'))
+				rows = connection.exec_driver_sql(f'EXPLAIN (ANALYZE, BUFFERS) {statement}', parameters).all()
+				transaction.rollback()
+		return [row[0] for row in rows]
+
+	@classmethod
+	def write(cls, entry: dict):
+		"""
+			Write an entry to the rotating file
+			:param entry: dict
+		"""
+		if cls.__logger is None:
+			Path(SlowLogEnv.FILE).parent.mkdir(parents=True, exist_ok=True)
+			handler = RotatingFileHandler(SlowLogEnv.FILE, maxBytes=SlowLogEnv.MAX_BYTES, backupCount=SlowLogEnv.BACKUP_COUNT, encoding='utf-8')
+			handler.setFormatter(Formatter('%(message)s'))
+			cls.__logger = getLogger('nail_booking.slow')
+			cls.__logger.addHandler(handler)
+			cls.__logger.setLevel('INFO')
+			cls.__logger.propagate = False
+
+		cls.__logger.info(dumps(entry, default=str))
+		with cls.__lock:
+			cls.logged += 1
+
+	@classmethod
+	def stats(cls) -> dict[str, int]:
+		with cls.__lock:
+			return {
+				'pending': cls.queue.qsize(),
+				'logged': cls.logged,
+				'dropped': cls.dropped,
+			}
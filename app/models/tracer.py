@@ -0,0 +1,138 @@
+from collections import Counter
+from contextvars import ContextVar, Token
+from logging import getLogger
+from re import compile as re_compile
+from threading import Lock
+from time import perf_counter
+
+from sqlalchemy import event, Engine
+
+from utils.env import TracerEnv
+
+
+class Trace:
+	"""
+		Statements issued by one action
+		ATTRIBUTES:
+			name: str, Class.method
+			statements: int
+			time: float, seconds spent in the database
+			shapes: Counter, statements per shape
+			token: Token, restores the trace of the caller
+	"""
+
+	def __init__(self, name: str):
+		self.name = name
+		self.token: Token = None
+		self.statements = 0
+		self.time = 0.0
+		self.shapes: Counter = Counter()
+
+	def add(self, statement: str, elapsed: float):
+		self.statements += 1
+		self.time += elapsed
+		self.shapes[StatementTracer.shape(statement)] += 1
+
+	@property
+	def repeated(self) -> list[tuple[str, int]]:
+		return [(shape, count) for shape, count in self.shapes.most_common(TracerEnv.SHAPES) if count >= TracerEnv.MAX_REPEATS]
+
+	@property
+	def flagged(self) -> bool:
+		return self.statements > TracerEnv.MAX_STATEMENTS or self.time > TracerEnv.MAX_TIME or bool(self.repeated)
+
+
+class StatementTracer:
+	"""
+		Opt-in tracer counting the statements and the database time of every Mapper.execute call,
+		the actions over the TracerEnv thresholds are logged with their repeated statement shapes
+		ATTRIBUTES:
+			current: ContextVar[Trace | None], trace of the running action
+			logger: Logger
+			traced: int
+			flagged: int
+		METHODS:
+			listen: register the cursor listeners on an engine
+			shape: return the shape of a statement, with the parameters and the IN lists collapsed
+			begin: start the trace of an action
+			end: close the trace of an action and log it if flagged
+			stats: return the counters as dict
+	"""
+
+	current: ContextVar[Trace | None] = ContextVar('current_trace', default=None)
+	logger = getLogger('nail_booking.tracer')
+	parameters = re_compile(r'%\(\w+\)s|\$\d+|\?|\b\d+\b')
+	lists = re_compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+	spaces = re_compile(r'\s+')
+	traced: int = 0
+	flagged: int = 0
+	__lock = Lock()
+
+	@classmethod
+	def listen(cls, engine: Engine) -> Engine:
+		"""
+			Register the cursor listeners on engine, only if the tracer is enabled
+			:param engine: Engine
+			:return: Engine
+		"""
+		if TracerEnv.ENABLED:
+			event.listen(engine, 'before_cursor_execute', cls.before_cursor_execute)
+			event.listen(engine, 'after_cursor_execute', cls.after_cursor_execute)
+		return engine
+
+	@staticmethod
+	def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+		# the start is kept on the execution context, so a failed statement leaves nothing behind on the connection
+		if StatementTracer.current.get() is not None:
+			context.trace_started = perf_counter()
+
+	@staticmethod
+	def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+		trace = StatementTracer.current.get()
+		started = getattr(context, 'trace_started', None)
+		if trace is not None and started is not None:
+			trace.add(statement, perf_counter() - started)
+
+	@classmethod
+	def shape(cls, statement: str) -> str:
+		"""
+			Return the shape of a statement, with the parameters and the IN lists collapsed
+			:param statement: str
+			:return: str
+		"""
+		return cls.lists.sub('(?)', cls.parameters.sub('?', cls.spaces.sub(' ', statement).strip()))
+
+	@classmethod
+	def begin(cls, name: str) -> Trace:
+		"""
+			Start the trace of an action, the trace also names the running action for the slow statement log
+			:param name: str, Class.method
+			:return: Trace
+		"""
+		trace = Trace(name)
+		trace.token = cls.current.set(trace)
+		return trace
+
+	@classmethod
+	def end(cls, trace: Trace):
+		"""
+			Close the trace of an action and log it if over the thresholds
+			:param trace: Trace
+		"""
+		cls.current.reset(trace.token)
+		if not TracerEnv.ENABLED:
+			return
+		with cls.__lock:
+			cls.traced += 1
+			cls.flagged += trace.flagged
+		if trace.flagged:
+			cls.logger.warning(
+				'%s: %d statements in %.3fs%s',
+				trace.name, trace.statements, trace.time,
+				''.join(f'\n\t{count}x {shape}' for shape, count in trace.repeated),
+			)
+
+	@classmethod
+	def stats(cls) -> dict[str, int]:
+		with cls.__lock:
+			return {'traced': cls.traced, 'flagged': cls.flagged}
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, String, Date, ForeignKey, DateTime, Integer, DECIMAL, Boolean, CheckConstraint
+from collections import Counter
+from sqlalchemy import Column, String, Date, ForeignKey, DateTime, Integer, DECIMAL, Boolean, CheckConstraint, Index, case, inspect
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.sql import func
-from sqlalchemy.orm import deferred
+from sqlalchemy.orm import deferred, Session
 from typing import Sequence
 
 from app.models.base import Model, Base
@@ -167,11 +169,15 @@ class CouponModel(Model, Base):
 			get_by_user: get by user
 			generate: generate
 			increase: increase
+			increase_many: increase the coupons of many users
+			merge_duplicates: merge the coupons of the users having more than one
+			has_unique_user: return True if the unique index on id_user exists
 	"""
 
 	__tablename__ = 'coupons'
 	__table_args__ = (
 		CheckConstraint('count >= 0 and count <= 8'),
+		Index('ix_coupons_id_user', 'id_user', unique=True),
 	)
 
 	id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
@@ -179,6 +185,7 @@ class CouponModel(Model, Base):
 	discount = Column(DECIMAL(10, 2), nullable=False)
 	count = Column(Integer, nullable=False)
 	upd_datetime = deferred(Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()))
+	unique_user = None
 
 	def __init__(self, id_user: int, discount: float, count: int):
 		super().__init__()
@@ -195,29 +202,133 @@ class CouponModel(Model, Base):
 
 	@classmethod
 	def generate(cls, user: UserModel) -> 'CouponModel':
+		"""
+			Create the coupon of a user, the one created meanwhile by a concurrent call is returned instead.
+			Without the unique index on id_user the coupon is inserted as is
+			:param user: UserModel
+			:return: CouponModel
+		"""
 		_min = list(ParamsEnv.CATALOG.DISCOUNT.values())[0]
+		if not cls.has_unique_user():
+			with cls.get_session() as session:
+				_coupon = cls(user.id, _min, 0)
+				session.add(_coupon)
+				session.flush()
+				session.refresh(_coupon)
+			return _coupon
+
 		with cls.get_session() as session:
-			_coupon = cls(user.id, _min, 0)
-			session.add(_coupon)
-			session.flush()
-			session.refresh(_coupon)
+			_coupon = session.scalars(
+				insert(cls).values(id_user=user.id, discount=_min, count=0).on_conflict_do_nothing(index_elements=[cls.id_user]).returning(cls)
+			).first()
+			if not _coupon:
+				_coupon = session.query(cls).filter(cls.id_user == user.id).first()
 		return _coupon
 
 	def increase(self) -> 'CouponModel':
-		with self.get_session() as session:
-			_coupon: 'CouponModel' = session.query(CouponModel).filter(CouponModel.id == self.id).first()
+		_coupons = self.increase_many([self.id_user])
+		return _coupons[0] if _coupons else None
+
+	@classmethod
+	def increase_many(cls, id_users: list[int], session: Session = None) -> list['CouponModel']:
+		"""
+			Increase the coupons of many users with one upsert, a user listed n times is increased n times.
+			The count wraps after 8 and the discount tier is computed in the statement, the missing coupons
+			are created as if generated and increased.
+			Without the unique index on id_user the first coupon of each user is locked and increased instead
+			:param id_users: list[int]
+			:param session: Session, the upsert joins its transaction when given
+			:return: list[CouponModel]
+		"""
+		if not id_users:
+			return []
+
+		_values = list(ParamsEnv.CATALOG.DISCOUNT.values())
+		_min, _max = _values[0], _values[1]
+
+		if not cls.has_unique_user():
+			if session is not None:
+				return cls.__increase_each(session, Counter(id_users), _min, _max)
+			with cls.get_session() as session:
+				return cls.__increase_each(session, Counter(id_users), _min, _max)
+
+		rows = []
+		for id_user, increment in Counter(id_users).items():
+			count = (increment - 1) % 8 + 1
+			rows.append({'id_user': id_user, 'count': count, 'discount': _min if count <= 4 else _max})
+
+		statement = insert(cls).values(rows)
+		count = (cls.count + statement.excluded.count - 1) % 8 + 1
+		statement = statement.on_conflict_do_update(
+			index_elements=[cls.id_user],
+			set_={
+				'count': count,
+				'discount': case((count <= 4, _min), else_=_max),
+				'upd_datetime': func.now(),
+			}
+		).returning(cls)
+
+		if session is not None:
+			return session.scalars(statement).all()
+		with cls.get_session() as session:
+			return session.scalars(statement).all()
+
+	@classmethod
+	def __increase_each(cls, session: Session, increments: Counter, _min: float, _max: float) -> list['CouponModel']:
+		_coupons = []
+		for id_user, increment in increments.items():
+			_coupon = session.query(cls).filter(cls.id_user == id_user).order_by(cls.id).with_for_update().first()
 			if not _coupon:
-				return _coupon
+				_coupon = cls(id_user, _min, 0)
+				session.add(_coupon)
+			_coupon.count = (_coupon.count + increment - 1) % 8 + 1
+			_coupon.discount = _min if _coupon.count <= 4 else _max
+			_coupons.append(_coupon)
+		session.flush()
+		return _coupons
 
-			_coupon.count += 1
-			if _coupon.count > 8:
-				_coupon.count = 1
+	@classmethod
+	def merge_duplicates(cls) -> int:
+		"""
+			Merge the coupons of the users having more than one, so the unique index on id_user can be created.
+			The oldest coupon is kept with the counts summed and wrapped after 8, the others are deleted.
+			Run at startup before create_indexes, it does nothing once the coupons are unique
+			:return: int, deleted coupons
+		"""
+		_values = list(ParamsEnv.CATALOG.DISCOUNT.values())
+		_min, _max = _values[0], _values[1]
 
-			_values = list(ParamsEnv.CATALOG.DISCOUNT.values())
-			_min, _max = _values[0], _values[1]
+		with cls.get_session() as session:
+			duplicated = session.query(cls.id_user).filter(cls.id_user.isnot(None)).group_by(cls.id_user).having(func.count(cls.id) > 1)
+			_coupons: list['CouponModel'] = session.query(cls).filter(cls.id_user.in_(duplicated)).order_by(cls.id_user, cls.id).all()
+
+			kept: dict[int, 'CouponModel'] = {}
+			total: dict[int, int] = {}
+			for _coupon in _coupons:
+				total[_coupon.id_user] = total.get(_coupon.id_user, 0) + _coupon.count
+				if _coupon.id_user in kept:
+					session.delete(_coupon)
+				else:
+					kept[_coupon.id_user] = _coupon
+
+			for id_user, _coupon in kept.items():
+				_coupon.count = (total[id_user] - 1) % 8 + 1 if total[id_user] else 0
+				_coupon.discount = _min if _coupon.count <= 4 else _max
+		return len(_coupons) - len(kept)
 
-			_coupon.discount = _min if 1 <= _coupon.count <= 4 else _max
-		return _coupon
+	@classmethod
+	def has_unique_user(cls) -> bool:
+		"""
+			Return True if the unique index on id_user exists, the upserts need it as conflict target.
+			Checked once per process, create_indexes runs at startup before the first coupon is written
+			:return: bool
+		"""
+		if cls.unique_user is None:
+			cls.unique_user = any(
+				index['unique'] and index['column_names'] == ['id_user']
+				for index in inspect(cls.engine).get_indexes(cls.__tablename__)
+			)
+		return cls.unique_user
 
 	def to_dict(self, exclude: Sequence[str] = None) -> dict:
 		_excluded = exclude or ('upd_datetime',)
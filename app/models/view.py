@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Integer, DateTime, Boolean, Enum
+from sqlalchemy import Column, String, Text, Integer, DateTime, Boolean, Enum, Index, desc
 from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from sqlalchemy.schema import CheckConstraint
@@ -64,6 +64,9 @@ class ViewGalleryModel(Model, Base, ConstViewStates):
 	"""
 
 	__tablename__ = 'view_gallery'
+	__table_args__ = (
+		Index('ix_view_gallery_state_order_upd', 'state', 'order', desc('upd_datetime'), desc('id')),
+	)
 
 	id = Column(Integer, primary_key=True, autoincrement=True)
 	title = deferred(Column(String(255), nullable=True))
@@ -96,6 +99,9 @@ class ViewFeedbackModel(Model, Base, ConstViewStates):
 	"""
 
 	__tablename__ = 'view_feedback'
+	__table_args__ = (
+		Index('ix_view_feedback_state_upd', 'state', 'upd_datetime', 'id'),
+	)
 
 	id = Column(Integer, primary_key=True, autoincrement=True)
 	title = Column(String(255), nullable=True)
@@ -24,7 +24,7 @@ class BookingService(Service):
 
 	@classmethod
 	async def cancel_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
-		return await cls.entity.cancel_booking(**kwargs)
+		return await cls.entity.execute('cancelBooking', **kwargs)
 
 	@classmethod
 	async def get_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
@@ -32,7 +32,7 @@ class BookingService(Service):
 
 	@classmethod
 	async def edit_booking(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
-		return await cls.entity.edit_booking(**kwargs)
+		return await cls.entity.execute('editBooking', **kwargs)
 
 	@classmethod
 	def confirm_booking_by_code(cls, confirm_code: str) -> dict[str, Union[bool, str, dict]]:
@@ -60,7 +60,7 @@ class BookingService(Service):
 
 	@classmethod
 	async def edit_booking_internal_data(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
-		return await cls.entity.edit_booking_internal_data(**kwargs)
+		return await cls.entity.execute('editBookingInternalData', **kwargs)
 
 	@classmethod
 	async def get_all_booking_data(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
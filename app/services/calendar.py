@@ -0,0 +1,139 @@
+from datetime import date, datetime
+from threading import Lock
+from time import monotonic
+
+from app.models.booking import BookingModel
+from utils.constants import EnumBookingStates, ConstRoles
+from utils.env import CalendarEnv
+
+
+class CalendarCache:
+	"""
+		Cache of the month calendars, every row is stored with its serialized payload.
+		The month is loaded once with every booking, the role classes are filtered from it:
+			admin: every booking
+			guest: free future bookings, memoized per day
+			user: free future bookings and the bookings of the user
+		ATTRIBUTES:
+			excluded: tuple[str], fields left out of the payload
+			months: dict[tuple[int, int], dict], rows and role class subsets of each month
+			versions: dict[tuple[int, int], int], bumped on every invalidation
+		METHODS:
+			role_class: return the role class of a user
+			visible: filter the rows visible by a user
+			overlay: return the payload of a row with the fields of a user
+			version: return the version of a month
+			get: get the rows of a month for a user
+			set: store the rows of a month loaded at version
+			invalidate: drop a month
+	"""
+
+	excluded = ('date', 'id_user', 'note', 'id_request', 'upd_datetime', 'upd_user')
+	months: dict[tuple[int, int], dict] = {}
+	versions: dict[tuple[int, int], int] = {}
+	__lock = Lock()
+
+	@staticmethod
+	def role_class(user) -> str:
+		"""
+			Return the role class of a user
+			:param user: UserModel | TempUser
+			:return: str
+		"""
+		match user.role:
+			case ConstRoles.ADMIN:
+				return 'admin'
+			case ConstRoles.GUEST:
+				return 'guest'
+			case _:
+				return 'user'
+
+	@staticmethod
+	def is_public(booking: BookingModel, today: date) -> bool:
+		return booking.date >= today and booking.status == EnumBookingStates.FREE and booking.id_user is None
+
+	@classmethod
+	def visible(cls, rows: list[tuple[BookingModel, dict]], user, today: date) -> list[tuple[BookingModel, dict]]:
+		"""
+			Filter the rows visible by user
+			:param rows: list[tuple[BookingModel, dict]]
+			:param user: UserModel | TempUser
+			:param today: date
+			:return: list[tuple[BookingModel, dict]]
+		"""
+		if cls.role_class(user) == 'admin':
+			return rows
+		return [row for row in rows if row[0].id_user == user.id or cls.is_public(row[0], today)]
+
+	@staticmethod
+	def overlay(booking: BookingModel, payload: dict, user, now: datetime) -> dict:
+		"""
+			Return the payload of a row with the fields of a user
+			:param booking: BookingModel
+			:param payload: dict
+			:param user: UserModel | TempUser
+			:param now: datetime
+			:return: dict
+		"""
+		return {
+			**payload,
+			'editable': booking.is_editable(user, now),
+			'other': booking.is_other(user),
+		}
+
+	@classmethod
+	def version(cls, year: int, month: int) -> int:
+		with cls.__lock:
+			return cls.versions.get((year, month), 0)
+
+	@classmethod
+	def get(cls, year: int, month: int, user, today: date) -> list[tuple[BookingModel, dict]] | None:
+		"""
+			Get the rows of a month visible by user, None on miss
+			:param year: int
+			:param month: int
+			:param user: UserModel | TempUser
+			:param today: date
+			:return: list[tuple[BookingModel, dict]] | None
+		"""
+		with cls.__lock:
+			entry = cls.months.get((year, month))
+			if not entry or entry['expires'] < monotonic():
+				return None
+
+			match cls.role_class(user):
+				case 'admin':
+					return entry['rows']
+				case 'guest':
+					if entry['guest'][0] != today:
+						entry['guest'] = (today, cls.visible(entry['rows'], user, today))
+					return entry['guest'][1]
+				case _:
+					return cls.visible(entry['rows'], user, today)
+
+	@classmethod
+	def set(cls, year: int, month: int, version: int, rows: list[tuple[BookingModel, dict]]):
+		"""
+			Store the rows of a month, unless the month was invalidated while they were loaded
+			:param year: int
+			:param month: int
+			:param version: int
+			:param rows: list[tuple[BookingModel, dict]]
+		"""
+		now = monotonic()
+		with cls.__lock:
+			if cls.versions.get((year, month), 0) != version:
+				return
+			for key in [key for key, entry in cls.months.items() if entry['expires'] < now]:
+				del cls.months[key]
+			cls.months[(year, month)] = {
+				'expires': now + CalendarEnv.CACHE_TTL,
+				'rows': rows,
+				'guest': (None, []),
+			}
+
+	@classmethod
+	def invalidate(cls, year: int, month: int):
+		with cls.__lock:
+			cls.versions[(year, month)] = cls.versions.get((year, month), 0) + 1
+			cls.months.pop((year, month), None)
@@ -1,40 +1,304 @@
+from collections import OrderedDict
+from json import dumps, loads
+from threading import Lock
+from time import monotonic
 from uuid import uuid4
 
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from sqlalchemy import Date, DateTime
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.sql import ClauseElement
+
+from app.models.user import UserModel, TempUser
+from utils.env import ContextEnv, RedisEnv
+
+
+def dump_user(user: UserModel | TempUser) -> str:
+	"""
+		Serialize a user snapshot with every loaded column but the password
+		:param user: UserModel | TempUser
+		:return: str
+	"""
+	if isinstance(user, TempUser):
+		return dumps({'type': 'temp', 'data': user.to_dict()}, default=str)
+
+	columns = UserModel.__table__.columns
+	return dumps({
+		'type': 'user',
+		'data': {
+			key: value for key, value in user.__dict__.items()
+			if key in columns and key != 'password' and not isinstance(value, ClauseElement)
+		},
+	}, default=str)
+
+
+def load_user(snapshot: str) -> UserModel | TempUser:
+	"""
+		Build a detached user from a snapshot, the columns missing in the snapshot are left unloaded
+		as on a user detached from its session
+		:param snapshot: str
+		:return: UserModel | TempUser
+	"""
+	snapshot: dict = loads(snapshot)
+	if snapshot['type'] == 'temp':
+		return TempUser()
+
+	columns = UserModel.__table__.columns
+	user: UserModel = UserModel.__mapper__.class_manager.new_instance()
+	for key, value in snapshot['data'].items():
+		if key not in columns:
+			continue
+		if value is not None and isinstance(columns[key].type, (Date, DateTime)):
+			value = columns[key].type.python_type.fromisoformat(value)
+		setattr(user, key, value)
+	make_transient_to_detached(user)
+	return user
+
+
+class LocalBackend:
+	"""
+		In process Context backend, entries expire after ContextEnv.TTL seconds of inactivity
+		and the least recently used ones are evicted above ContextEnv.MAX_ENTRIES
+		ATTRIBUTES:
+			context: OrderedDict[str, tuple[float, UserModel | TempUser]], ordered by last access
+			expired: int
+			evicted: int
+	"""
+
+	def __init__(self):
+		self.context = OrderedDict()
+		self.expired = 0
+		self.evicted = 0
+		self.__lock = Lock()
+
+	def __purge(self, now: float):
+		while self.context:
+			key, (last_access, _) = next(iter(self.context.items()))
+			if now - last_access <= ContextEnv.TTL:
+				break
+			del self.context[key]
+			self.expired += 1
+		while len(self.context) > ContextEnv.MAX_ENTRIES:
+			self.context.popitem(last=False)
+			self.evicted += 1
+
+	def get(self, key):
+		now = monotonic()
+		with self.__lock:
+			if key not in self.context:
+				return None
+			last_access, value = self.context[key]
+			if now - last_access > ContextEnv.TTL:
+				del self.context[key]
+				self.expired += 1
+				return None
+			self.context[key] = (now, value)
+			self.context.move_to_end(key)
+			return value
+
+	def set(self, key, value):
+		now = monotonic()
+		with self.__lock:
+			self.context[key] = (now, value)
+			self.context.move_to_end(key)
+			self.__purge(now)
+
+	def add(self, key, value) -> bool:
+		if self.get(key) is not None:
+			return False
+		self.set(key, value)
+		return True
+
+	def delete(self, key):
+		with self.__lock:
+			self.context.pop(key, None)
+
+	async def get_async(self, key):
+		return self.get(key)
+
+	async def delete_async(self, key):
+		self.delete(key)
+
+	def __contains__(self, key) -> bool:
+		return self.get(key) is not None
+
+	def __len__(self) -> int:
+		with self.__lock:
+			self.__purge(monotonic())
+			return len(self.context)
+
+	def stats(self) -> dict[str, int]:
+		return {
+			'entries': len(self),
+			'expired': self.expired,
+			'evicted': self.evicted,
+		}
+
+
+class RedisBackend:
+	"""
+		Context backend shared by every node through Redis, users are stored as snapshots with a sliding TTL
+		and kept for a few seconds in a local LRU to avoid a round trip on every lookup.
+		The blocking handlers use the sync client from their worker, the coroutines the asyncio one
+		ATTRIBUTES:
+			prefix: str
+			client: Redis
+			async_client: redis.asyncio.Redis
+			local: OrderedDict[str, tuple[float, UserModel | TempUser]]
+	"""
+
+	prefix = 'context:'
+
+	def __init__(self):
+		self.client = Redis(host=RedisEnv.HOST, port=int(RedisEnv.PORT))
+		self.async_client = AsyncRedis(host=RedisEnv.HOST, port=int(RedisEnv.PORT))
+		self.local = OrderedDict()
+		self.__lock = Lock()
+
+	def __cache(self, key, value):
+		with self.__lock:
+			self.local[key] = (monotonic() + ContextEnv.LOCAL_TTL, value)
+			self.local.move_to_end(key)
+			while len(self.local) > ContextEnv.LRU_SIZE:
+				self.local.popitem(last=False)
+
+	def __cached(self, key):
+		with self.__lock:
+			expires, value = self.local.get(key, (0, None))
+			if expires > monotonic():
+				self.local.move_to_end(key)
+				return value
+		return None
+
+	def __load(self, key, snapshot):
+		if snapshot is None:
+			with self.__lock:
+				self.local.pop(key, None)
+			return None
+		value = load_user(snapshot)
+		self.__cache(key, value)
+		return value
+
+	def get(self, key):
+		value = self.__cached(key)
+		if value is not None:
+			return value
+		return self.__load(key, self.client.getex(self.prefix + key, ex=ContextEnv.TTL))
+
+	async def get_async(self, key):
+		value = self.__cached(key)
+		if value is not None:
+			return value
+		return self.__load(key, await self.async_client.getex(self.prefix + key, ex=ContextEnv.TTL))
+
+	def set(self, key, value):
+		self.client.set(self.prefix + key, dump_user(value), ex=ContextEnv.TTL)
+		self.__cache(key, value)
+
+	def add(self, key, value) -> bool:
+		if not self.client.set(self.prefix + key, dump_user(value), ex=ContextEnv.TTL, nx=True):
+			return False
+		self.__cache(key, value)
+		return True
+
+	def delete(self, key):
+		self.client.delete(self.prefix + key)
+		with self.__lock:
+			self.local.pop(key, None)
+
+	async def delete_async(self, key):
+		await self.async_client.delete(self.prefix + key)
+		with self.__lock:
+			self.local.pop(key, None)
+
+	def __contains__(self, key) -> bool:
+		return self.get(key) is not None
+
+	def __len__(self) -> int:
+		"""
+			Count the shared entries, scans the whole keyspace so it is left out of the stats
+			:return: int
+		"""
+		return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*', count=1000))
+
+	def stats(self) -> dict[str, int]:
+		with self.__lock:
+			return {
+				'local_entries': len(self.local),
+			}
+
 
 class ContextDict:
+	"""
+		Context of the logged users, indexed by identifier
+		ATTRIBUTES:
+			backends: dict[str, type]
+			backend: LocalBackend | RedisBackend, selected by ContextEnv.BACKEND
+		METHODS:
+			get_async: get a user without blocking the event loop
+			delete_async: delete a user without blocking the event loop
+			add_user: add a user with a new identifier
+			stats: return the gauge of the live entries
+	"""
 
-	context = {}
+	backends = {
+		'LOCAL': LocalBackend,
+		'REDIS': RedisBackend,
+	}
 
 	def __init__(self):
-		pass
+		self.backend = self.backends[ContextEnv.BACKEND]()
 
 	def __enter__(self):
-		return self.context
+		return self.backend
 
 	def __getitem__(self, key):
-		return self.context.get(key, None)
+		return self.backend.get(key)
 
 	def __setitem__(self, key, value):
-		self.context[key] = value
+		self.backend.set(key, value)
 
 	def __exit__(self, exc_type, exc_value, traceback):
 		pass
 
 	def __repr__(self):
-		return str(self.context)
+		return f'{self.backend.__class__.__name__}({len(self.backend)})'
 
 	def __contains__(self, item):
-		return item in self.context
+		return item in self.backend
 
 	def __delitem__(self, key):
-		if key in self.context:
-			del self.context[key]
+		self.backend.delete(key)
+
+	def __len__(self):
+		return len(self.backend)
+
+	async def get_async(self, key):
+		"""
+			Get a user, to be used by the coroutines instead of Context[key] and key in Context
+			:param key: str
+			:return: UserModel | TempUser | None
+		"""
+		return await self.backend.get_async(key)
+
+	async def delete_async(self, key):
+		await self.backend.delete_async(key)
+
+	def stats(self) -> dict[str, str | int]:
+		"""
+			Return the gauge of the live entries
+			:return: dict
+		"""
+		return {
+			'backend': ContextEnv.BACKEND,
+			**self.backend.stats(),
+		}
 
 	def add_user(self, user) -> str:
 		identifier = str(uuid4())
-		while identifier in self.context:
+		while not self.backend.add(identifier, user):
 			identifier = str(uuid4())
-		self.context[identifier] = user
 		return identifier
 
 Context = ContextDict()
@@ -0,0 +1,72 @@
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable
+
+from sqlalchemy import text
+
+from utils.env import HomeEnv
+
+
+class HomeCache:
+	"""
+		Snapshot of the home contents, keyed per content, theme and device.
+		The entries are stamped with a digest of the view_home rows, checked at most every HomeEnv.STAMP_INTERVAL seconds,
+		so the changes made by any process or directly on the database drop the snapshot
+		ATTRIBUTES:
+			stamp_query: TextClause, digest of the view_home rows
+			entries: dict[Hashable, Any]
+			stamp: str, digest the entries were loaded at
+			checked: float, monotonic time of the last check of the stamp
+		METHODS:
+			expired: return True if the stamp has to be checked
+			validate: drop the entries if the stamp changed
+			get: get an entry
+			set: store an entry loaded at stamp
+			invalidate: drop the entries and force a check of the stamp
+	"""
+
+	stamp_query = text("""SELECT md5(string_agg(view_home::text, ',' ORDER BY view_home::text COLLATE "C")) FROM view_home""")
+	entries: dict[Hashable, Any] = {}
+	stamp: str = None
+	checked: float = 0.0
+	__lock = Lock()
+
+	@classmethod
+	def expired(cls) -> bool:
+		return monotonic() - cls.checked > HomeEnv.STAMP_INTERVAL
+
+	@classmethod
+	def validate(cls, stamp: str):
+		"""
+			Drop the entries if the stamp changed
+			:param stamp: str
+		"""
+		with cls.__lock:
+			if stamp != cls.stamp:
+				cls.entries.clear()
+				cls.stamp = stamp
+			cls.checked = monotonic()
+
+	@classmethod
+	def get(cls, key: Hashable) -> Any:
+		with cls.__lock:
+			return cls.entries.get(key)
+
+	@classmethod
+	def set(cls, key: Hashable, value: Any, stamp: str):
+		"""
+			Store an entry, unless the snapshot was dropped while it was loaded
+			:param key: Hashable
+			:param value: Any
+			:param stamp: str
+		"""
+		with cls.__lock:
+			if stamp == cls.stamp and cls.checked:
+				cls.entries[key] = value
+
+	@classmethod
+	def invalidate(cls):
+		with cls.__lock:
+			cls.entries.clear()
+			cls.stamp = None
+			cls.checked = 0.0
@@ -30,6 +30,10 @@ class MailService(Service):
 	def get_mails_to_send(cls) -> dict[str, Union[bool, str, dict]]:
 		return cls.entity.get_mails_to_send()
 
+	@classmethod
+	def set_mails_results(cls, completed: list[int], errors: list[int]) -> dict[str, Union[bool, str, dict]]:
+		return cls.entity.set_mails_results(completed, errors)
+
 	@classmethod
 	def generate_confirmed_mail(cls) -> dict[str, Union[bool, str, dict]]:
 		return cls.entity.generate_confirmed_mail()
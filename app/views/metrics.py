@@ -0,0 +1,28 @@
+from hmac import compare_digest
+
+from django.http import HttpResponse, HttpResponseForbidden, Http404
+
+from app.models.error import ErrorSink
+from app.models.pool import PoolMetrics
+from app.models.slowlog import SlowStatementLog
+from app.models.tracer import StatementTracer
+from app.services.context import Context
+from utils.env import MetricsEnv
+from utils.executor import BlockingExecutor
+from utils.metrics import Metrics
+
+
+def metrics(request) -> HttpResponse:
+	if not MetricsEnv.ENABLED or not (MetricsEnv.TOKEN or MetricsEnv.PUBLIC):
+		raise Http404
+	if MetricsEnv.TOKEN and not compare_digest(request.headers.get('Authorization', ''), f'Bearer {MetricsEnv.TOKEN}'):
+		return HttpResponseForbidden()
+
+	return HttpResponse(Metrics.render({
+		'pool': {name: pool.snapshot() for name, pool in list(PoolMetrics.registry.items())},
+		'executor': BlockingExecutor.snapshot(),
+		'context': Context.stats(),
+		'errors': ErrorSink.stats(),
+		'tracer': StatementTracer.stats(),
+		'slow': SlowStatementLog.stats(),
+	}), content_type='text/plain; version=0.0.4; charset=utf-8')
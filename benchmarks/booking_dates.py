@@ -0,0 +1,69 @@
+"""
+	Compare the plans of the booking date filters on a temporary copy of the booking table.
+	Nothing is written to the booking table, the copy is dropped with the transaction.
+	Usage: python -m benchmarks.booking_dates [rows]
+"""
+from sys import argv
+
+from sqlalchemy import text
+
+from app.models.base import Model
+
+
+ROWS: int = int(argv[1]) if len(argv) > 1 else 300000
+
+SEED = """
+	INSERT INTO bench_booking (id, date, start, "end", id_user, status)
+	SELECT
+		g,
+		DATE '2015-01-01' + g / 80,
+		TIME '08:00' + (g % 10) * INTERVAL '1 hour',
+		TIME '09:00' + (g % 10) * INTERVAL '1 hour',
+		CASE WHEN g % 3 = 0 THEN NULL ELSE g % 5000 END,
+		CASE WHEN g % 3 = 0 THEN 'FREE' ELSE (ARRAY['BOOKED', 'CONFIRMED', 'COMPLETED', 'CANCELLED'])[g % 4 + 1] END
+	FROM generate_series(1, :rows) AS g
+"""
+
+INDEXES = (
+	'CREATE INDEX ON bench_booking (date, status, start)',
+	"CREATE INDEX ON bench_booking (date, start) WHERE id_user IS NULL AND status = 'FREE'",
+)
+
+QUERIES: dict[str, str] = {
+	'calendar, cast like': "SELECT * FROM bench_booking WHERE CAST(date AS VARCHAR) LIKE '2020-06-%' ORDER BY date, status, start",
+	'calendar, date range': "SELECT * FROM bench_booking WHERE date >= '2020-06-01' AND date < '2020-07-01' ORDER BY date, status, start",
+	'calendar guest, cast like': "SELECT * FROM bench_booking WHERE CAST(date AS VARCHAR) LIKE '2020-06-%' AND id_user IS NULL AND status = 'FREE' ORDER BY date, start",
+	'calendar guest, date range': "SELECT * FROM bench_booking WHERE date >= '2020-06-01' AND date < '2020-07-01' AND id_user IS NULL AND status = 'FREE' ORDER BY date, start",
+	'bookings of the day, cast equal': "SELECT * FROM bench_booking WHERE CAST(date AS VARCHAR) = '2020-06-15'",
+	'bookings of the day, date equal': "SELECT * FROM bench_booking WHERE date = '2020-06-15'",
+}
+
+
+def explain(connection, query: str) -> str:
+	"""
+		Return the plan of query
+		:param connection: Connection
+		:param query: str
+		:return: str
+	"""
+	return '\n'.join(connection.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {query}')).scalars().all())
+
+
+def main():
+	with Model.engine.connect() as connection:
+		transaction = connection.begin()
+		try:
+			connection.execute(text('CREATE TEMP TABLE bench_booking (LIKE booking INCLUDING DEFAULTS) ON COMMIT DROP'))
+			connection.execute(text(SEED), {'rows': ROWS})
+			for index in INDEXES:
+				connection.execute(text(index))
+			connection.execute(text('ANALYZE bench_booking'))
+
+			for name, query in QUERIES.items():
+				print(f'--- {name} ({ROWS} rows)\n{explain(connection, query)}\n')
+		finally:
+			transaction.rollback()
+
+
+if __name__ == '__main__':
+	main()
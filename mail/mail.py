@@ -1,4 +1,5 @@
 from contextlib import ExitStack
+from string import Template
 
 from utils.constants import EnumMailTypes, EnumMailComponents
 
@@ -36,3 +37,5 @@ with ExitStack() as stack:
 			**mail_components,
 		}.items()
 	}
+
+templates: dict[str, Template] = {key: Template(value) for key, value in mails.items()}
@@ -7,6 +7,8 @@ from django.core.asgi import get_asgi_application
 from app.consumers.routing import urlpatterns
 from app.cronjobs.cron import Cron
 from app.events.event import Event
+from app.models.base import Model
+from app.models.user import CouponModel
 
 environ.setdefault("DJANGO_SETTINGS_MODULE", "nail_booking_b.settings")
 
@@ -21,5 +23,9 @@ application: ProtocolTypeRouter = ProtocolTypeRouter(
 	}
 )
 
+Model.create_enum_values()
+Model.create_columns()
+CouponModel.merge_duplicates()
+Model.create_indexes()
 Cron.start_process()
 Event.start_process()
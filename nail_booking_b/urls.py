@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from app.views.metrics import metrics
+
 urlpatterns: list[path] = [
 	path('admin/', admin.site.urls),
 	path('api/', include('app.views.routing')),
+	path('metrics/', metrics, name='metrics'),
 ]
@@ -84,6 +84,13 @@ class ConstRoles(Constants):
 	}
 
 
+class ConstBookingGroups(Constants):
+	RELOAD = 'events.booking'
+	ADMIN = 'events.booking.admin'
+	PUBLIC = 'events.booking.public'
+	USER = 'events.booking.user.{id_user}'
+
+
 class ConstConfirmCodes(Constants):
 	CONFIRM_BOOKING = '?confirm_booking={code}'
 	BOOK_BOOKING = '?book_booking={code}'
@@ -154,13 +161,15 @@ class EnumMailComponents(Enum):
 
 class EnumMailStates(Enum):
 	TO_SEND = 'TO_SEND'
+	SENDING = 'SENDING'
 	COMPLETE = 'COMPLETE'
 	ERROR = 'ERROR'
 
 	name = 'mail_states'
-	values = [TO_SEND, COMPLETE, ERROR]
+	values = [TO_SEND, SENDING, COMPLETE, ERROR]
 	labels = {
 		TO_SEND: 'Da inviare',
+		SENDING: 'In invio',
 		COMPLETE: 'Completata',
 		ERROR: 'Errore',
 	}
@@ -215,6 +224,9 @@ class SQLEvents(Enum):
 	AFTER_INSERT = 'after_insert'
 	AFTER_UPDATE = 'after_update'
 	AFTER_DELETE = 'after_delete'
+	AFTER_COMMIT = 'after_commit'
+	AFTER_ROLLBACK = 'after_rollback'
+	AFTER_SOFT_ROLLBACK = 'after_soft_rollback'
 
 
 class States(Enum):
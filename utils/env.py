@@ -1,5 +1,7 @@
 from os import environ
+from os.path import join
 from json import loads
+from tempfile import gettempdir
 
 
 class DatabaseEnv:
@@ -9,6 +11,17 @@ class DatabaseEnv:
 	PORT: int = environ.get('DB_PORT', -1)
 	NAME: str = environ.get('DB_NAME', '')
 	DIALECT: str = environ.get('DB_DIALECT', '')
+	ASYNC_DIALECT: str = environ.get('DB_ASYNC_DIALECT', 'postgresql+asyncpg')
+	POOL_MODE: str = environ.get('DB_POOL_MODE', 'QUEUE')
+	POOL_SIZE: int = int(environ.get('DB_POOL_SIZE', 5))
+	POOL_MAX_OVERFLOW: int = int(environ.get('DB_POOL_MAX_OVERFLOW', 10))
+	POOL_TIMEOUT: int = int(environ.get('DB_POOL_TIMEOUT', 30))
+	POOL_RECYCLE: int = int(environ.get('DB_POOL_RECYCLE', 1800))
+	POOL_PRE_PING: bool = environ.get('DB_POOL_PRE_PING', 'True') == 'True'
+
+
+class ExecutorEnv:
+	POOL_SIZE: int = int(environ.get('EXECUTOR_POOL_SIZE', DatabaseEnv.POOL_SIZE + DatabaseEnv.POOL_MAX_OVERFLOW))
 
 
 class RedisEnv:
@@ -16,6 +29,70 @@ class RedisEnv:
 	PORT: int = environ.get('REDIS_PORT', -1)
 
 
+class ContextEnv:
+	BACKEND: str = environ.get('CONTEXT_BACKEND', 'LOCAL')
+	TTL: int = int(environ.get('CONTEXT_TTL', 86400))
+	LOCAL_TTL: int = int(environ.get('CONTEXT_LOCAL_TTL', 5))
+	LRU_SIZE: int = int(environ.get('CONTEXT_LRU_SIZE', 1024))
+	MAX_ENTRIES: int = int(environ.get('CONTEXT_MAX_ENTRIES', 10000))
+	RELEASE_ON_DISCONNECT: bool = environ.get('CONTEXT_RELEASE_ON_DISCONNECT', 'True') == 'True'
+
+
+class CalendarEnv:
+	CACHE_TTL: int = int(environ.get('CALENDAR_CACHE_TTL', 300))
+
+
+class ErrorEnv:
+	QUEUE_SIZE: int = int(environ.get('ERROR_QUEUE_SIZE', 1000))
+	BATCH_SIZE: int = int(environ.get('ERROR_BATCH_SIZE', 100))
+	FLUSH_INTERVAL: float = float(environ.get('ERROR_FLUSH_INTERVAL', 2))
+
+
+class HomeEnv:
+	STAMP_INTERVAL: float = float(environ.get('HOME_STAMP_INTERVAL', 30))
+
+
+class EventEnv:
+	COALESCE_WINDOW: float = float(environ.get('EVENT_COALESCE_WINDOW', 0.25))
+	SEND_TIMEOUT: float = float(environ.get('EVENT_SEND_TIMEOUT', 5))
+	MAIL_EVENTS: bool = environ.get('EVENT_MAIL_EVENTS', 'True') == 'True'
+	MAIL_WINDOW: float = float(environ.get('EVENT_MAIL_WINDOW', 1))
+	RELOAD_MESSAGES: bool = environ.get('EVENT_RELOAD_MESSAGES', 'True') == 'True'
+
+
+class CronEnv:
+	LEADER: str = environ.get('CRON_LEADER', 'LOCAL')
+	LEADER_TTL: float = float(environ.get('CRON_LEADER_TTL', 30))
+	LEADER_INTERVAL: float = float(environ.get('CRON_LEADER_INTERVAL', 10))
+	LEADER_LOCK_ID: int = int(environ.get('CRON_LEADER_LOCK_ID', 726101))
+
+
+class MetricsEnv:
+	ENABLED: bool = environ.get('METRICS_ENABLED', 'True') == 'True'
+	TOKEN: str = environ.get('METRICS_TOKEN', '')
+	PUBLIC: bool = environ.get('METRICS_PUBLIC', 'False') == 'True'
+
+
+class TracerEnv:
+	ENABLED: bool = environ.get('TRACER_ENABLED', 'False') == 'True'
+	MAX_STATEMENTS: int = int(environ.get('TRACER_MAX_STATEMENTS', 10))
+	MAX_REPEATS: int = int(environ.get('TRACER_MAX_REPEATS', 3))
+	MAX_TIME: float = float(environ.get('TRACER_MAX_TIME', 0.25))
+	SHAPES: int = int(environ.get('TRACER_SHAPES', 5))
+
+
+class SlowLogEnv:
+	THRESHOLD: float = float(environ.get('SLOW_LOG_THRESHOLD', 0))
+	DIR: str = environ.get('LOG_DIR', gettempdir())
+	FILE: str = environ.get('SLOW_LOG_FILE', join(DIR, 'slow_statements.log'))
+	MAX_BYTES: int = int(environ.get('SLOW_LOG_MAX_BYTES', 10 * 1024 * 1024))
+	BACKUP_COUNT: int = int(environ.get('SLOW_LOG_BACKUP_COUNT', 5))
+	QUEUE_SIZE: int = int(environ.get('SLOW_LOG_QUEUE_SIZE', 1000))
+	EXPLAIN: bool = environ.get('SLOW_LOG_EXPLAIN', 'False') == 'True'
+	EXPLAIN_INTERVAL: float = float(environ.get('SLOW_LOG_EXPLAIN_INTERVAL', 300))
+	EXPLAIN_TIMEOUT: int = int(environ.get('SLOW_LOG_EXPLAIN_TIMEOUT', 10000))
+
+
 class RunningMode:
 
 	mode: str = ''
@@ -62,6 +139,13 @@ class EmailEnv:
 	PORT: int = environ.get('EMAIL_PORT', -1)
 	HOST: str = environ.get('EMAIL_HOST', '')
 	ATTEMPTS: int = environ.get('EMAIL_ATTEMPTS', -1)
+	POOL_SIZE: int = int(environ.get('EMAIL_POOL_SIZE', 4))
+	POOL_IDLE: int = int(environ.get('EMAIL_POOL_IDLE', 240))
+	CONCURRENCY: int = min(int(environ.get('EMAIL_CONCURRENCY', POOL_SIZE)), POOL_SIZE)
+	RENDER_CACHE_SIZE: int = int(environ.get('EMAIL_RENDER_CACHE_SIZE', 256))
+	BATCH_SIZE: int = int(environ.get('EMAIL_BATCH_SIZE', 50))
+	LEASE: int = int(environ.get('EMAIL_LEASE', 600))
+	BACKOFF: int = int(environ.get('EMAIL_BACKOFF', 60))
 	ADMIN = AdminEnv()
 	INFO = InfoEnv()
 
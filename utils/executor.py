@@ -0,0 +1,146 @@
+from asyncio import AbstractEventLoop, get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable
+
+from utils.env import ExecutorEnv
+
+
+def blocking(func: Callable) -> Callable:
+	"""
+		Flag a handler as blocking, Mapper.execute will run it in the BlockingExecutor
+		:param func: Callable
+		:return: Callable
+	"""
+	func.blocking = True
+	return func
+
+
+class HandlerStats:
+	"""
+		Handler Stats
+		ATTRIBUTES:
+			name: str
+			queued: int
+			running: int
+			calls: int
+			wait_total: float
+			wait_max: float
+			run_total: float
+			run_max: float
+		METHODS:
+			enqueue: record a call waiting for a worker
+			start: record a call picked up by a worker and its wait time
+			done: record a completed call and its run time
+			snapshot: return the counters as dict
+	"""
+
+	def __init__(self, name: str):
+		self.name = name
+		self.queued = 0
+		self.running = 0
+		self.calls = 0
+		self.wait_total = 0.0
+		self.wait_max = 0.0
+		self.run_total = 0.0
+		self.run_max = 0.0
+		self.__lock = Lock()
+
+	def enqueue(self):
+		with self.__lock:
+			self.queued += 1
+
+	def start(self, wait: float):
+		with self.__lock:
+			self.queued -= 1
+			self.running += 1
+			self.wait_total += wait
+			self.wait_max = max(self.wait_max, wait)
+
+	def done(self, run: float):
+		with self.__lock:
+			self.running -= 1
+			self.calls += 1
+			self.run_total += run
+			self.run_max = max(self.run_max, run)
+
+	def snapshot(self) -> dict[str, int | float]:
+		"""
+			Return the counters as dict
+			:return: dict
+		"""
+		with self.__lock:
+			started = self.calls + self.running
+			return {
+				'queued': self.queued,
+				'running': self.running,
+				'calls': self.calls,
+				'wait_avg': round(self.wait_total / started, 6) if started else 0.0,
+				'wait_max': round(self.wait_max, 6),
+				'run_avg': round(self.run_total / self.calls, 6) if self.calls else 0.0,
+				'run_max': round(self.run_max, 6),
+			}
+
+
+class BlockingExecutor:
+	"""
+		Bounded thread pool for the handlers that still use the sync session
+		ATTRIBUTES:
+			pool: ThreadPoolExecutor
+			stats: dict[str, HandlerStats]
+			loop: AbstractEventLoop, the event loop serving the requests
+		METHODS:
+			get: get (or create) the stats of a handler
+			run: run a handler in the pool and await its result
+			snapshot: return the stats of the pool and of every handler
+	"""
+
+	pool = ThreadPoolExecutor(max_workers=ExecutorEnv.POOL_SIZE, thread_name_prefix='blocking')
+	stats: dict[str, HandlerStats] = {}
+	loop: AbstractEventLoop = None
+
+	@classmethod
+	def get(cls, name: str) -> HandlerStats:
+		if name not in cls.stats:
+			cls.stats[name] = HandlerStats(name)
+		return cls.stats[name]
+
+	@classmethod
+	async def run(cls, name: str, func: Callable, **kwargs) -> Any:
+		"""
+			Run func in the pool, the context variables of the caller are copied in the worker
+			:param name: str
+			:param func: Callable
+			:param kwargs: dict
+			:return: Any
+		"""
+		cls.loop = get_running_loop()
+		stats = cls.get(name)
+		stats.enqueue()
+		queued = perf_counter()
+
+		def call():
+			started = perf_counter()
+			stats.start(started - queued)
+			try:
+				return func(**kwargs)
+			finally:
+				stats.done(perf_counter() - started)
+
+		return await cls.loop.run_in_executor(cls.pool, copy_context().run, call)
+
+	@classmethod
+	def snapshot(cls) -> dict[str, int | dict]:
+		"""
+			Return the stats of the pool and of every handler
+			:return: dict
+		"""
+		handlers = {name: stats.snapshot() for name, stats in list(cls.stats.items())}
+		return {
+			'size': ExecutorEnv.POOL_SIZE,
+			'queued': sum(h['queued'] for h in handlers.values()),
+			'running': sum(h['running'] for h in handlers.values()),
+			'handlers': handlers,
+		}
@@ -48,6 +48,7 @@ class Errors:
 	MISSING_FIELDS = 'Campi mancanti'
 
 	INVALID_INPUT = 'Input {key} non valido per {value}'
+	INVALID_CURSOR = 'Cursore di paginazione non valido'
 	NO_INPUT = 'Input {key} non trovato'
 
 	INVALID_REQUEST_NEW_BOOKING = 'Richiesta nuova prenotazione non valida'
@@ -0,0 +1,182 @@
+from bisect import bisect_left
+from threading import Lock
+
+from utils.env import MetricsEnv
+
+
+class ActionStats:
+	"""
+		Action Stats, the latencies are counted in fixed buckets so recording a call costs a bisect and a lock
+		ATTRIBUTES:
+			bounds: tuple[float], upper bounds of the latency buckets in seconds
+			name: str
+			calls: int
+			errors: int, calls that raised
+			failures: int, calls that returned a response with status False
+			buckets: list[int], calls per latency bucket, the last one is unbounded
+			total: float
+			max: float
+		METHODS:
+			observe: record a call
+			percentile: estimate a latency percentile from the buckets
+			snapshot: return the counters as dict
+	"""
+
+	bounds: tuple[float] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+	quantiles: tuple[float] = (0.5, 0.95, 0.99)
+
+	def __init__(self, name: str):
+		self.name = name
+		self.calls = 0
+		self.errors = 0
+		self.failures = 0
+		self.buckets = [0] * (len(self.bounds) + 1)
+		self.total = 0.0
+		self.max = 0.0
+		self.__lock = Lock()
+
+	def observe(self, elapsed: float, error: bool = False, failure: bool = False):
+		index = bisect_left(self.bounds, elapsed)
+		with self.__lock:
+			self.calls += 1
+			self.errors += error
+			self.failures += failure
+			self.buckets[index] += 1
+			self.total += elapsed
+			self.max = max(self.max, elapsed)
+
+	def percentile(self, quantile: float) -> float:
+		"""
+			Estimate a latency percentile, interpolating inside the bucket holding it
+			:param quantile: float, between 0 and 1
+			:return: float
+		"""
+		with self.__lock:
+			buckets, calls, highest = list(self.buckets), self.calls, self.max
+		if not calls:
+			return 0.0
+
+		rank = quantile * calls
+		seen = 0
+		for index, count in enumerate(buckets):
+			if count and seen + count >= rank:
+				lower = self.bounds[index - 1] if index else 0.0
+				upper = self.bounds[index] if index < len(self.bounds) else highest
+				return round(min(lower + (upper - lower) * (rank - seen) / count, highest), 6)
+			seen += count
+		return round(highest, 6)
+
+	def snapshot(self) -> dict[str, int | float | list]:
+		"""
+			Return the counters as dict
+			:return: dict
+		"""
+		snapshot = {f'p{int(quantile * 100)}': self.percentile(quantile) for quantile in self.quantiles}
+		with self.__lock:
+			return {
+				'calls': self.calls,
+				'errors': self.errors,
+				'failures': self.failures,
+				'avg': round(self.total / self.calls, 6) if self.calls else 0.0,
+				'max': round(self.max, 6),
+				**snapshot,
+				'sum': round(self.total, 6),
+				'buckets': list(self.buckets),
+			}
+
+
+class Metrics:
+	"""
+		In process registry of the action stats, rendered in the Prometheus text format
+		ATTRIBUTES:
+			actions: dict[str, ActionStats]
+			prefix: str, prefix of the rendered metrics
+		METHODS:
+			get: get (or create) the stats of an action
+			observe: record a call of an action
+			snapshot: return the stats of every action
+			render: render the stats of every action and the given gauges as text
+			gauges: render the numeric values of a snapshot as gauges
+	"""
+
+	actions: dict[str, ActionStats] = {}
+	prefix = 'nail_booking'
+	__lock = Lock()
+
+	@classmethod
+	def get(cls, name: str) -> ActionStats:
+		stats = cls.actions.get(name)
+		if stats is None:
+			with cls.__lock:
+				stats = cls.actions.setdefault(name, ActionStats(name))
+		return stats
+
+	@classmethod
+	def observe(cls, name: str, elapsed: float, error: bool = False, failure: bool = False):
+		"""
+			Record a call of an action
+			:param name: str, Class.method
+			:param elapsed: float, seconds
+			:param error: bool
+			:param failure: bool
+		"""
+		if MetricsEnv.ENABLED:
+			cls.get(name).observe(elapsed, error, failure)
+
+	@classmethod
+	def snapshot(cls) -> dict[str, dict]:
+		return {name: stats.snapshot() for name, stats in sorted(cls.actions.items())}
+
+	@classmethod
+	def render(cls, gauges: dict[str, dict] = None) -> str:
+		"""
+			Render the stats of every action and the given gauges as text
+			:param gauges: dict[str, dict], snapshot of each component, keyed by component name
+			:return: str
+		"""
+		name = f'{cls.prefix}_action'
+		lines = [
+			f'# TYPE {name}_calls_total counter',
+			f'# TYPE {name}_errors_total counter',
+			f'# TYPE {name}_failures_total counter',
+			f'# TYPE {name}_latency_seconds histogram',
+			f'# TYPE {name}_latency_quantile_seconds gauge',
+		]
+		for action, stats in cls.snapshot().items():
+			label = f'action="{action}"'
+			lines.append(f'{name}_calls_total{{{label}}} {stats["calls"]}')
+			lines.append(f'{name}_errors_total{{{label}}} {stats["errors"]}')
+			lines.append(f'{name}_failures_total{{{label}}} {stats["failures"]}')
+			cumulative = 0
+			for bound, count in zip((*ActionStats.bounds, '+Inf'), stats['buckets']):
+				cumulative += count
+				lines.append(f'{name}_latency_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+			lines.append(f'{name}_latency_seconds_sum{{{label}}} {stats["sum"]}')
+			lines.append(f'{name}_latency_seconds_count{{{label}}} {stats["calls"]}')
+			for quantile in ActionStats.quantiles:
+				lines.append(f'{name}_latency_quantile_seconds{{{label},quantile="{quantile}"}} {stats[f"p{int(quantile * 100)}"]}')
+
+		for component, snapshot in (gauges or {}).items():
+			lines.extend(cls.gauges(f'{cls.prefix}_{component}', snapshot))
+		return '\n'.join(lines) + '\n'
+
+	@classmethod
+	def gauges(cls, name: str, snapshot: dict, labels: str = '') -> list[str]:
+		"""
+			Render the numeric values of a snapshot as gauges.
+			A nested dict of values is rendered with its key as name label, a nested dict of dicts extends the name
+			:param name: str
+			:param snapshot: dict
+			:param labels: str
+			:return: list[str]
+		"""
+		lines = []
+		for key, value in snapshot.items():
+			if isinstance(value, dict):
+				if all(isinstance(item, dict) for item in value.values()):
+					lines.extend(cls.gauges(f'{name}_{key}', value))
+				else:
+					lines.extend(cls.gauges(name, value, f'name="{key}"'))
+			elif isinstance(value, (bool, int, float)):
+				lines.append(f'{name}_{key}{{{labels}}} {float(value)}' if labels else f'{name}_{key} {float(value)}')
+		return lines
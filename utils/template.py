@@ -1,11 +1,18 @@
+from asyncio import get_running_loop
 from datetime import date, time, datetime
+from inspect import isawaitable
+from time import perf_counter
 from traceback import format_exc
-from typing import Union
+from typing import Callable, Union
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm.session import Session
 
 from app.models.base import Model
 from app.models.error import ErrorModel
+from app.models.tracer import StatementTracer
+from utils.executor import BlockingExecutor
+from utils.metrics import Metrics
 from utils.tools import response
 from utils.messages import Errors
 
@@ -22,15 +29,44 @@ class Mapper:
 				setattr(self, key, value)
 
 	async def execute(self, method_name: str, **kwargs) -> dict[str, Union[bool, str, dict]]:
+		name = f'{self.__class__.__name__}.{method_name}'
+		started = perf_counter()
+		result, error = None, True
+		trace = StatementTracer.begin(name)
 		# noinspection PyBroadException
 		try:
-			return await self._method_mapping[self.__class__.__name__][method_name](**kwargs)
+			BlockingExecutor.loop = get_running_loop()
+			handler = self._method_mapping[self.__class__.__name__][method_name]
+			if getattr(handler, 'blocking', False):
+				result = await BlockingExecutor.run(name, self.unit_of_work(handler), **kwargs)
+			else:
+				result = handler(**kwargs)
+				result = await result if isawaitable(result) else result
+			error = False
+			return result
 		except KeyError:
+			if method_name not in self._method_mapping.get(self.__class__.__name__, {}):
+				name = f'{self.__class__.__name__}.<unknown>'
 			self.save_error(f'Error in {self.__class__.__name__}.{method_name}: Method not found\n{"\n".join("{key}: {value}".format(key=key, value=value) for key, value in kwargs.items())}')
 			return self.default()
 		except Exception:
 			self.save_error(f'Error in {self.__class__.__name__}.{method_name}:\n{"\n".join("{key}: {value}".format(key=key, value=value) for key, value in kwargs.items())}\n{format_exc()}')
 			return self.default()
+		finally:
+			StatementTracer.end(trace)
+			Metrics.observe(name, perf_counter() - started, error, isinstance(result, dict) and result.get('status') is False)
+
+	@staticmethod
+	def unit_of_work(handler: Callable) -> Callable:
+		"""
+			Run a blocking handler in one unit of work, every session it opens shares a single connection and commit
+			:param handler: Callable
+			:return: Callable
+		"""
+		def run(**kwargs):
+			with Model.unit_of_work():
+				return handler(**kwargs)
+		return run
 
 	# noinspection PyUnusedLocal
 	@staticmethod
@@ -47,6 +83,24 @@ class Mapper:
 		# noinspection PyTypeChecker
 		return Model.get_session(commit)
 
+	@staticmethod
+	def rollback(session: Session):
+		"""
+			Roll back the work of the current get_session block
+			:param session: Session
+		"""
+		Model.rollback(session)
+
+	@staticmethod
+	def get_async_session(commit=True) -> AsyncSession:
+		"""
+			Get AsyncSession, to be used with async with
+			:param commit: bool
+			:return: AsyncSession
+		"""
+		# noinspection PyTypeChecker
+		return Model.get_async_session(commit)
+
 	@staticmethod
 	def result_to_dict(res: object) -> dict:
 		"""
@@ -1,5 +1,8 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
 from colorama import Fore
 import datetime as d
+from json import dumps, loads
 from typing import Union, Any
 
 from utils.messages import Errors
@@ -33,6 +36,36 @@ def response(status: Union[str, bool], message: str = '', content: any = None) -
 	}
 
 
+def encode_cursor(*values: Any) -> str:
+	"""
+		Encode the sort key of the last row of a page in an opaque cursor
+		:param values: Any, datetimes are encoded in iso format
+		:return: str
+	"""
+	return urlsafe_b64encode(dumps([
+		value.isoformat() if isinstance(value, d.datetime) else value for value in values
+	]).encode()).decode()
+
+
+def decode_cursor(cursor: str, *types: type) -> list[Any]:
+	"""
+		Decode a cursor made by encode_cursor
+		:param cursor: str
+		:param types: type, type of each value, None values are kept
+		:return: list[Any]
+	"""
+	try:
+		values = loads(urlsafe_b64decode(cursor.encode()))
+		if not isinstance(values, list) or len(values) != len(types):
+			raise ValueError
+		return [
+			None if value is None else d.datetime.fromisoformat(value) if type_ is d.datetime else type_(value)
+			for value, type_ in zip(values, types)
+		]
+	except (DecodeError, TypeError, ValueError):
+		raise ValueError(Errors.INVALID_CURSOR)
+
+
 class Parameter:
 	__default: Any
 	__format: str
@@ -1,12 +1,13 @@
-from sqlalchemy import and_
-from sqlalchemy.orm import Query
+from datetime import datetime
+from sqlalchemy import and_, select, tuple_, Select
+from sqlalchemy.orm import undefer
 from typing import Union
 
 from app.services.context import Context
 from utils.constants import ConstDevice, ConstRoles, EnumBookingStates
 from utils.exceptions import exception
 from utils.env import SettingsEnv
-from utils.tools import response, Parameter
+from utils.tools import response, Parameter, encode_cursor, decode_cursor
 from utils.messages import generic_error, Messages, Errors
 from views.view import View
 
@@ -27,22 +28,39 @@ class FeedbackView(View):
 
 	@classmethod
 	@exception(generic_error)
-	def get_feedbacks(cls,  _id: int = None, limit: int = None, offset: int=None) -> dict[str, Union[bool, str, list[View.Feedback]]]:
+	async def get_feedbacks(cls,  _id: int = None, limit: int = None, offset: int=None, cursor: list = None) -> dict[str, Union[bool, str, list[View.Feedback]]]:
 		if _id:
-			feedback: cls.Feedback = cls.Feedback.get(cls.Feedback.id == _id)
+			feedback: cls.Feedback = await cls.Feedback.get_async(cls.Feedback.id == _id)
 			return response(True, '', [feedback])
 
-		with cls.get_session(commit=False) as session:
-			query: Query = session.query(cls.Feedback).filter(cls.Feedback.state == True).order_by(cls.Feedback.upd_datetime.desc())
+		async with cls.get_async_session(commit=False) as session:
+			query: Select = select(cls.Feedback).options(undefer(cls.Feedback.upd_datetime)).where(cls.Feedback.state == True).order_by(
+				cls.Feedback.upd_datetime.desc(),
+				cls.Feedback.id.desc(),
+			)
+			if cursor:
+				query: Select = query.where(tuple_(cls.Feedback.upd_datetime, cls.Feedback.id) < tuple_(*cursor))
 			if limit:
-				query: Query = query.limit(limit)
+				query: Select = query.limit(limit)
 			if offset:
-				query: Query = query.offset(offset)
+				query: Select = query.offset(offset)
 
-			list_feedback: list[cls.Feedback] = query.all()
+			list_feedback: list[cls.Feedback] = (await session.scalars(query)).all()
 
 		return response(True, '', list_feedback)
 
+	@staticmethod
+	def get_cursor(feedbacks: list, limit: int) -> str | None:
+		"""
+			Return the cursor of the next page, None on the last page
+			:param feedbacks: list[Feedback]
+			:param limit: int
+			:return: str | None
+		"""
+		if len(feedbacks) < limit:
+			return None
+		return encode_cursor(feedbacks[-1].upd_datetime, feedbacks[-1].id)
+
 	@classmethod
 	@exception(generic_error)
 	async def get_view_data(cls, **kwargs) -> dict[str, Union[bool, str, dict]]:
@@ -57,11 +75,14 @@ class FeedbackView(View):
 		else:
 			max_feedback = 10
 
-		feedbacks = cls.get_feedbacks(limit=max_feedback)
+		feedbacks = await cls.get_feedbacks(limit=max_feedback)
 		if not feedbacks['status']:
 			return feedbacks
 
-		return response(True, '', {'feedback': [feedback.to_dict(MAX_FEEDBACK_LENGTH) for feedback in feedbacks['content']]})
+		return response(True, '', {
+			'feedback': [feedback.to_dict(MAX_FEEDBACK_LENGTH) for feedback in feedbacks['content']],
+			'cursor': cls.get_cursor(feedbacks['content'], max_feedback),
+		})
 
 	@classmethod
 	@exception(generic_error)
@@ -72,7 +93,7 @@ class FeedbackView(View):
 			return response(False, str(e))
 		del kwargs
 
-		feedback = cls.get_feedbacks(_id=_id)
+		feedback = await cls.get_feedbacks(_id=_id)
 		if not feedback['status']:
 			return feedback
 
@@ -84,6 +105,8 @@ class FeedbackView(View):
 		try:
 			_device: int = Parameter('device', kwargs, int, False, default_=ConstDevice.DESKTOP).value
 			_len: int = Parameter('len', kwargs, int, False, default_=0).value
+			_cursor: str = Parameter('cursor', kwargs, str, False).value
+			cursor: list = decode_cursor(_cursor, datetime, int) if _cursor else None
 		except ValueError as e:
 			return response(False, str(e))
 		del kwargs
@@ -93,12 +116,18 @@ class FeedbackView(View):
 		else:
 			max_feedback = 10
 
-		feedbacks = cls.get_feedbacks(limit=max_feedback, offset=_len)
+		if cursor:
+			feedbacks = await cls.get_feedbacks(limit=max_feedback, cursor=cursor)
+		else:
+			feedbacks = await cls.get_feedbacks(limit=max_feedback, offset=_len)
 
 		if not feedbacks['status']:
 			return feedbacks
 
-		return response(True, '', {'feedback': [feedback.to_dict(MAX_FEEDBACK_LENGTH) for feedback in feedbacks['content']]})
+		return response(True, '', {
+			'feedback': [feedback.to_dict(MAX_FEEDBACK_LENGTH) for feedback in feedbacks['content']],
+			'cursor': cls.get_cursor(feedbacks['content'], max_feedback),
+		})
 
 	@classmethod
 	@exception(generic_error)
@@ -112,16 +141,16 @@ class FeedbackView(View):
 			return response(False, str(e))
 		del kwargs
 
-		if not _identifier in Context:
+		user: cls.User = await Context.get_async(_identifier)
+		if not user:
 			return generic_error
-		user: cls.User = Context[_identifier]
-		with cls.get_session() as session:
-			id_booking: cls.Booking.id = session.query(cls.Booking.id).filter(
+		async with cls.get_async_session() as session:
+			id_booking: cls.Booking.id = await session.scalar(select(cls.Booking.id).where(
 				and_(
 					cls.Booking.id_user == user.id,
 					cls.Booking.status == EnumBookingStates.COMPLETED
 				)
-			).first()
+			).limit(1))
 			if not id_booking and not user.role == ConstRoles.ADMIN:
 				return response(False, Errors.NEED_BOOKING_TO_FEEDBACK)
 
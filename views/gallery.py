@@ -1,9 +1,11 @@
-from sqlalchemy import and_
+from datetime import datetime
+from sqlalchemy import and_, or_, select, Select
+from sqlalchemy.orm import undefer
 
 from utils.constants import ConstDevice
 from utils.env import SettingsEnv
 from utils.exceptions import exception
-from utils.tools import response, Parameter
+from utils.tools import response, Parameter, encode_cursor, decode_cursor
 from utils.messages import generic_error, Errors
 from views.view import View
 
@@ -21,6 +23,53 @@ class GalleryView(View):
 		}
 		super().__init__(**kwargs)
 
+	@classmethod
+	def get_gallery_query(cls, limit: int, cursor: list = None) -> Select:
+		"""
+			Query of a page of the active images, ordered by order then most recent.
+			With a cursor the page starts after the image it points to
+			:param limit: int
+			:param cursor: list, order, upd_datetime and id of the last image of the previous page
+			:return: Select
+		"""
+		query: Select = select(cls.Gallery).options(
+			undefer(cls.Gallery.order),
+			undefer(cls.Gallery.upd_datetime),
+		).where(cls.Gallery.state == cls.Gallery.ACTIVE)
+
+		if cursor:
+			_order, _upd_datetime, _id = cursor
+			after = or_(
+				cls.Gallery.upd_datetime < _upd_datetime,
+				and_(cls.Gallery.upd_datetime == _upd_datetime, cls.Gallery.id < _id),
+			)
+			if _order is None:
+				query = query.where(and_(cls.Gallery.order.is_(None), after))
+			else:
+				query = query.where(or_(
+					cls.Gallery.order > _order,
+					cls.Gallery.order.is_(None),
+					and_(cls.Gallery.order == _order, after),
+				))
+
+		return query.order_by(
+			cls.Gallery.order,
+			cls.Gallery.upd_datetime.desc(),
+			cls.Gallery.id.desc(),
+		).limit(limit)
+
+	@staticmethod
+	def get_cursor(data: list, limit: int) -> str | None:
+		"""
+			Return the cursor of the next page, None on the last page
+			:param data: list[Gallery]
+			:param limit: int
+			:return: str | None
+		"""
+		if len(data) < limit:
+			return None
+		return encode_cursor(data[-1].order, data[-1].upd_datetime, data[-1].id)
+
 	@classmethod
 	@exception(generic_error)
 	async def get_view_data(cls, **kwargs):
@@ -35,21 +84,19 @@ class GalleryView(View):
 		else:
 			max_images = 10
 
-		with cls.get_session() as session:
-			data: list[cls.Gallery] = session.query(cls.Gallery).filter(cls.Gallery.state == True).order_by(
-				cls.Gallery.order,
-				cls.Gallery.upd_datetime.desc()
-			).limit(max_images).all()
+		async with cls.get_async_session(commit=False) as session:
+			data: list[cls.Gallery] = (await session.scalars(cls.get_gallery_query(max_images))).all()
 
-		return response(True, '', {'gallery':
-			[
+		return response(True, '', {
+			'gallery': [
 				{
 					'id': item.id,
 					'image': item.image,
 					'loading': True
 				}
 				for item in data
-			]
+			],
+			'cursor': cls.get_cursor(data, max_images),
 		})
 
 	@classmethod
@@ -58,6 +105,8 @@ class GalleryView(View):
 		try:
 			_device: int = Parameter('device', kwargs, int, False, default_=ConstDevice.DESKTOP).value
 			_len: int = Parameter('len', kwargs, int, False, default_=0).value
+			_cursor: str = Parameter('cursor', kwargs, str, False).value
+			cursor: list = decode_cursor(_cursor, int, datetime, int) if _cursor else None
 		except ValueError as e:
 			return response(False, str(e))
 		del kwargs
@@ -67,22 +116,22 @@ class GalleryView(View):
 		else:
 			max_images = 10
 
-		with cls.get_session() as session:
-			data: list[cls.Gallery] = session.query(cls.Gallery).filter(
-				and_(cls.Gallery.state == cls.Gallery.ACTIVE)
-			).order_by(
-				cls.Gallery.order,
-				cls.Gallery.upd_datetime.desc()
-			).offset(_len).limit(max_images).all()
+		query: Select = cls.get_gallery_query(max_images, cursor)
+		if not cursor and _len:
+			query = query.offset(_len)
+
+		async with cls.get_async_session(commit=False) as session:
+			data: list[cls.Gallery] = (await session.scalars(query)).all()
 
-		return response(True, '', {'gallery':
-			[
+		return response(True, '', {
+			'gallery': [
 				{
 					'id': item.id,
 					'image': item.image,
 				}
 				for item in data
-			]
+			],
+			'cursor': cls.get_cursor(data, max_images),
 		})
 
 
@@ -95,13 +144,16 @@ class GalleryView(View):
 			return response(False, str(e))
 		del kwargs
 
-		with cls.get_session(commit=False) as session:
-			data: cls.Gallery = session.query(cls.Gallery).filter(
+		async with cls.get_async_session(commit=False) as session:
+			data: cls.Gallery = await session.scalar(select(cls.Gallery).options(
+				undefer(cls.Gallery.title),
+				undefer(cls.Gallery.description),
+			).where(
 				and_(
 					cls.Gallery.state == cls.Gallery.ACTIVE,
 					cls.Gallery.id == _id
 				)
-			).first()
+			).limit(1))
 
 			if not data:
 				return response(False, Errors.NO_IMAGE)
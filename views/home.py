@@ -1,5 +1,6 @@
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, select
 
+from app.services.home import HomeCache
 from utils.constants import EnumDevice, ConstTheme, EnumHomeTypes
 from utils.tools import response, Parameter
 from utils.exceptions import exception
@@ -21,17 +22,40 @@ class HomeView(View):
 		super().__init__(**kwargs)
 
 	@classmethod
-	@exception(generic_error)
-	def get_header(cls, theme: int, device: int) -> View.Home:
-		with cls.get_session() as session:
-			return session.query(cls.Home).filter(
+	async def get_stamp(cls) -> str:
+		"""
+			Return the stamp of the home snapshot, checked against the database when expired
+			:return: str
+		"""
+		if HomeCache.expired():
+			async with cls.get_async_session(commit=False) as session:
+				HomeCache.validate(await session.scalar(HomeCache.stamp_query))
+		return HomeCache.stamp
+
+	@classmethod
+	async def get_header(cls, theme: int, device: int) -> dict | None:
+		stamp = await cls.get_stamp()
+		key = ('header', theme, device)
+		header = HomeCache.get(key)
+		if header is not None:
+			return header
+
+		async with cls.get_async_session(commit=False) as session:
+			header: cls.Home = await session.scalar(select(cls.Home).where(
 				and_(
 					cls.Home.type == 'HEADER',
 					cls.Home.device == EnumDevice.values[device],
 					cls.Home.title == ConstTheme.get_label(theme),
 					cls.Home.state == cls.Home.ACTIVE,
 				)
-			).first()
+			).limit(1))
+
+		if not header:
+			return None
+
+		header: dict = header.to_dict()
+		HomeCache.set(key, header, stamp)
+		return header
 
 	@classmethod
 	@exception(generic_error)
@@ -43,8 +67,14 @@ class HomeView(View):
 			return response(False, str(e))
 		del kwargs
 
-		with cls.get_session() as session:
-			data: list[cls.Home] = session.query(cls.Home).filter(
+		stamp = await cls.get_stamp()
+		key = ('view', _theme, _device)
+		content = HomeCache.get(key)
+		if content is not None:
+			return response(True, '', content)
+
+		async with cls.get_async_session(commit=False) as session:
+			data: list[cls.Home] = (await session.scalars(select(cls.Home).where(
 				and_(
 					cls.Home.state == cls.Home.ACTIVE,
 					or_(
@@ -56,15 +86,18 @@ class HomeView(View):
 						cls.Home.type.in_([_type for _type in EnumHomeTypes.values if _type != 'HEADER'])
 					)
 				)
-			).order_by(cls.Home.order).all()
+			).order_by(cls.Home.order))).all()
 
-			if not data:
-				return response(True, '', {'headerImage': '', 'sections': ''})
+		if not data:
+			content = {'headerImage': '', 'sections': ''}
+		else:
+			content = {
+				'headerImage': data[0].to_dict(),
+				'sections': tuple(image.to_dict() for image in data[1:])
+			}
 
-		return response(True, '', {
-			'headerImage': data[0].to_dict(),
-			'sections': tuple(image.to_dict() for image in data[1:])
-		})
+		HomeCache.set(key, content, stamp)
+		return response(True, '', content)
 
 	@classmethod
 	@exception(generic_error)
@@ -76,5 +109,7 @@ class HomeView(View):
 			return response(False, str(e))
 		del kwargs
 
-		header = cls.get_header(_theme, _device)
-		return response(True, '', {'headerImage': header.to_dict()})
+		header = await cls.get_header(_theme, _device)
+		if not header:
+			return generic_error
+		return response(True, '', {'headerImage': header})